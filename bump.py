@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+bump.py -- headless command line tool for BUMP bin files
+Author Paul L. D. Roberts
+Copyright 2020  Scripps Institution of Oceanography
+Distributed under MIT license. See license.txt for more information.
+
+Only NumPy and the bin file reader are imported, so the tool starts quickly and runs
+without a display or Qt. Examples:
+
+    python -m bump info c:\\Users\\paul\\Data
+    python -m bump export c:\\Users\\paul\\Data --output_dir c:\\Users\\paul\\Desktop --jobs 4
+    python -m bump export c:\\Users\\paul\\Data --continuous --start_time 2020-09-13T12:30
+    python -m bump verify c:\\Users\\paul\\Data --jobs 8
+    python -m bump thumbnails c:\\Users\\paul\\Data --output_dir c:\\Users\\paul\\Desktop
+"""
+
+import os
+import sys
+import json
+import logging
+from libs.logger import LOG, LOG_CONSOLE_HANDLER, log_to_dir
+from libs.argparse_tools import parse_cli_args
+from libs.file_tools import find_bin_files, format_time, parse_time, parse_frame_range, parse_roi
+from libs.raw_image import RawImage
+from libs.raw_image_collection import RawImageCollection
+
+
+def export_selection(frames=None, start_time=None, end_time=None, stride=None):
+    """Frame selection for batch_export from the --frames, --stride, --start_time and --end_time options"""
+
+    selection = {}
+    if frames:
+        selection['start'], selection['stop'] = parse_frame_range(frames)
+    if stride is not None:
+        if stride < 1:
+            raise ValueError('Stride must be a positive integer, got ' + str(stride))
+        selection['step'] = stride
+    if start_time:
+        selection['start_time'] = parse_time(start_time)
+    if end_time:
+        selection['end_time'] = parse_time(end_time)
+    return selection
+
+
+def run_export(paths, output_dir=None, jobs=None, compression=None, tile=None, selection=None, continuous=False,
+               roi=None, binning=1, force=False):
+    """Export all bin files found in paths, returns the process exit status"""
+
+    from libs.export_tools import batch_export
+
+    # elevate console log level
+    LOG_CONSOLE_HANDLER.setLevel(logging.DEBUG)
+    LOG.info('Exporting images, no GUI will be displayed.')
+
+    # with continuous, the frame range is applied to all files as one sequence
+    results = batch_export(find_bin_files(paths), output_dir, jobs, compression, tile, selection, roi, binning, force,
+                           continuous)
+    return 0 if all(r['ok'] for r in results) else 1
+
+
+def run_info(paths, as_json=False, timestamp=None, continuous=False):
+    """Print a summary of each bin file found in paths, or of all of them as one sequence,
+    and optionally the frame closest to timestamp, returns the process exit status"""
+
+    status = 0
+    bin_files = find_bin_files(paths)
+    if continuous:
+        bin_files = [bin_files]
+    for bin_file in bin_files:
+        try:
+            rw = RawImageCollection(bin_file) if continuous else RawImage(bin_file)
+        except Exception as e:
+            LOG.error('Could not read ' + str(bin_file) + ': ' + repr(e))
+            rw = None
+        if rw is None or not rw.file_valid:
+            if as_json:
+                print(json.dumps({'path': bin_file, 'error': 'unreadable'}))
+            else:
+                print(str(bin_file) + '\n    unreadable')
+            status = 1
+            continue
+        summary = rw.summary()
+        if timestamp is not None:
+            summary['time'] = timestamp
+            summary['frame_at_time'] = rw.find_frame(timestamp)
+        rw.close()
+
+        if as_json:
+            print(json.dumps(summary))
+        else:
+            print(summary['path'])
+            if continuous:
+                print('    %d files' % summary['files'])
+            print('    format %d, %d bytes per pixel, %d x %d, %d frames' % (
+                summary['format'], summary['pixel_format'], summary['width'], summary['height'], summary['frames']))
+            print('    %s to %s UTC (%.1f s)' % (
+                format_time(summary['start_time']), format_time(summary['end_time']), summary['duration'] or 0.0))
+            if timestamp is not None:
+                print('    frame %s is closest to %s UTC' % (summary['frame_at_time'], format_time(timestamp)))
+    return status
+
+
+def run_verify(paths, jobs=None, as_json=False):
+    """Check every bin file found in paths, returns 1 if any file has errors"""
+
+    from libs.verify import verify_bin_files
+
+    reports = verify_bin_files(find_bin_files(paths), jobs)
+    for report in reports:
+        if as_json:
+            print(json.dumps(report))
+            continue
+        print(report['path'])
+        line = '    %s  %d frames' % ('OK' if report['ok'] else 'ERRORS', report['frames'])
+        if report['duration'] is not None:
+            line += ', %.1f s' % report['duration']
+        if report['fps'] is not None:
+            line += ' at %.2f fps' % report['fps']
+        print(line + ', %d dropped frames' % report['dropped_frames'])
+        for message in report['errors']:
+            print('    error: ' + message)
+        for message in report['warnings']:
+            print('    warning: ' + message)
+    return 0 if all(r['ok'] for r in reports) else 1
+
+
+def run_thumbnails(paths, output_dir=None, columns=10, count=100, height=128, jobs=None):
+    """Write a contact sheet PNG for every bin file found in paths, returns 1 if any failed"""
+
+    # OpenCV is only needed for this command
+    from libs.thumbnails import write_contact_sheets
+
+    bin_files = find_bin_files(paths)
+    if not bin_files:
+        LOG.error('No bin files found')
+        return 1
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    outputs = write_contact_sheets(bin_files, output_dir, columns, count, height, jobs)
+    for output in outputs:
+        if output is not None:
+            print(output)
+    return 0 if all(o is not None for o in outputs) else 1
+
+
+def main(argv=None):
+
+    args = parse_cli_args(argv)
+
+    if args.log_dir:
+        log_to_dir(args.log_dir)
+
+    try:
+        if args.command == 'export':
+            selection = export_selection(args.frames, args.start_time, args.end_time, args.stride)
+            return run_export(args.paths, args.output_dir, args.jobs, args.compression, args.tile, selection,
+                              args.continuous, parse_roi(args.roi) if args.roi else None, args.binning, args.force)
+        elif args.command == 'info':
+            return run_info(args.paths, args.json, parse_time(args.time) if args.time else None, args.continuous)
+        elif args.command == 'verify':
+            return run_verify(args.paths, args.jobs, args.json)
+        elif args.command == 'thumbnails':
+            return run_thumbnails(args.paths, args.output_dir, args.columns, args.count, args.height, args.jobs)
+    except ValueError as e:
+        LOG.error(str(e))
+        return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
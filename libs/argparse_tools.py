@@ -1,4 +1,17 @@
 import argparse
+from libs.tiff_tools import COMPRESSION_TYPES
+
+def tile_size(value):
+    """argparse type for --tile, tiff tiles must be a positive multiple of 16"""
+
+    try:
+        size = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError('tile size must be an integer, got ' + value)
+    if size <= 0 or size % 16 != 0:
+        raise argparse.ArgumentTypeError('tile size must be a positive multiple of 16, got ' + value)
+    return size
+
 
 def parse_args():
     parser = argparse.ArgumentParser(description="BUMP Image - display and/or export BUMP files into Tiffs")
@@ -18,4 +31,186 @@ def parse_args():
         default=None,
         help="Output directory to use instead of location of bin files"
     )
+    parser.add_argument(
+        '--display',
+        choices=['image', 'raw', 'opengl'],
+        default='image',
+        help="Frame display: zoomable image view (default), or RawImageWidget or OpenGL for the fastest playback"
+    )
+    add_export_args(parser)
     return parser.parse_args()
+
+
+def add_export_args(parser):
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=None,
+        help="Number of worker processes to use for export (default: number of CPUs)"
+    )
+    parser.add_argument(
+        '--compression',
+        choices=COMPRESSION_TYPES,
+        default='none',
+        help="Lossless compression for exported tiffs (default: none)"
+    )
+    parser.add_argument(
+        '--tile',
+        type=tile_size,
+        default=None,
+        help="Write tiles of this size (a multiple of 16) instead of strips"
+    )
+    parser.add_argument(
+        '--frames',
+        type=str,
+        default=None,
+        help="Export only frames START:STOP of each file (python slice, either side may be empty)"
+    )
+    parser.add_argument(
+        '--stride',
+        type=int,
+        default=None,
+        help="Export every Nth frame of the selected range"
+    )
+    parser.add_argument(
+        '--roi',
+        type=str,
+        default=None,
+        help="Export only the pixel region X,Y,WIDTH,HEIGHT, aligned to the Bayer pattern"
+    )
+    parser.add_argument(
+        '--binning',
+        type=int,
+        default=1,
+        help="Average NxN blocks of each Bayer plane, the output stays a Bayer mosaic (default: 1)"
+    )
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help="Export again from the start, even files the export manifest lists as done"
+    )
+    parser.add_argument(
+        '--start_time',
+        type=str,
+        default=None,
+        help="Export only frames at or after this time (unix seconds or ISO 8601, UTC by default)"
+    )
+    parser.add_argument(
+        '--end_time',
+        type=str,
+        default=None,
+        help="Export only frames at or before this time (unix seconds or ISO 8601, UTC by default)"
+    )
+
+
+def parse_cli_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='bump',
+        description="BUMP Image command line tool - inspect and export BUMP bin files without the GUI"
+    )
+    parser.add_argument(
+        '--log_dir',
+        type=str,
+        default=None,
+        help="Also write the log to a file in this directory"
+    )
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    export_parser = subparsers.add_parser('export', help="Export bin files to tiff and json")
+    export_parser.add_argument(
+        'paths',
+        nargs='+',
+        help="Bin files or directories to search for bin files"
+    )
+    export_parser.add_argument(
+        '--output_dir',
+        type=str,
+        default=None,
+        help="Output directory to use instead of location of bin files"
+    )
+    add_export_args(export_parser)
+    export_parser.add_argument(
+        '--continuous',
+        action='store_true',
+        help="Treat all bin files as one time ordered sequence, --frames then counts across files"
+    )
+
+    info_parser = subparsers.add_parser('info', help="Print a summary of bin files")
+    info_parser.add_argument(
+        'paths',
+        nargs='+',
+        help="Bin files or directories to search for bin files"
+    )
+    info_parser.add_argument(
+        '--json',
+        action='store_true',
+        help="Print one JSON object per file"
+    )
+    info_parser.add_argument(
+        '--continuous',
+        action='store_true',
+        help="Summarize all bin files as one time ordered sequence"
+    )
+    info_parser.add_argument(
+        '--time',
+        type=str,
+        default=None,
+        help="Also print the frame closest to this time (unix seconds or ISO 8601, UTC by default)"
+    )
+
+    verify_parser = subparsers.add_parser('verify', help="Check bin files for dropped, damaged or truncated frames")
+    verify_parser.add_argument(
+        'paths',
+        nargs='+',
+        help="Bin files or directories to search for bin files"
+    )
+    verify_parser.add_argument(
+        '--jobs',
+        type=int,
+        default=None,
+        help="Number of worker processes to use (default: number of CPUs)"
+    )
+    verify_parser.add_argument(
+        '--json',
+        action='store_true',
+        help="Print one JSON object per file"
+    )
+
+    thumbnails_parser = subparsers.add_parser('thumbnails', help="Write a contact sheet PNG of thumbnails for each bin file")
+    thumbnails_parser.add_argument(
+        'paths',
+        nargs='+',
+        help="Bin files or directories to search for bin files"
+    )
+    thumbnails_parser.add_argument(
+        '--output_dir',
+        type=str,
+        default=None,
+        help="Output directory to use instead of location of bin files"
+    )
+    thumbnails_parser.add_argument(
+        '--columns',
+        type=int,
+        default=10,
+        help="Thumbnails per row (default: 10)"
+    )
+    thumbnails_parser.add_argument(
+        '--count',
+        type=int,
+        default=100,
+        help="Thumbnails per sheet, spread evenly through the file (default: 100)"
+    )
+    thumbnails_parser.add_argument(
+        '--height',
+        type=int,
+        default=128,
+        help="Thumbnail height in pixels (default: 128)"
+    )
+    thumbnails_parser.add_argument(
+        '--jobs',
+        type=int,
+        default=None,
+        help="Number of worker processes to use (default: number of CPUs)"
+    )
+    return parser.parse_args(argv)
@@ -1,6 +1,6 @@
 import cv2
-import numpy as np
 import pyqtgraph as pg
+from libs.logger import LOG
 
 pg.setConfigOptions(imageAxisOrder='row-major')
 
@@ -12,9 +12,15 @@ class ImageDisplay:
         self.view = view
         self.view.setCentralItem(self.view_box)
         self.view_box.setAspectLocked(True)
+        # rows run down the screen as in the frame, so frames are drawn without flipping them
+        self.view_box.invertY(True)
         self.line_tool = pg.LineSegmentROI([(10, 10), (10, 100)])
         self.view_box.addItem(self.line_tool)
         self.view_box.addItem(self.data_item)
+        # detail tiles drawn over the overview image, keyed by (level, row, col)
+        self.tiles = {}
+        self.color_scale = 255
+        self.levels = None
         # Contrast/color control
         self.hist = None
         self.event_handler = event_handler
@@ -41,9 +47,114 @@ class ImageDisplay:
 
     def draw(self, data, color_scale=255, size_scale=1):
 
-        scale = [0, color_scale]
-        data = np.flipud(data)
-        self.data_item.setImage(data, autoLevels=False, levels=scale, autoDownsample=True)
+        # the frame is shown as it is, levels are only set when the scale changes
+        if color_scale != self.color_scale:
+            self.set_levels(color_scale)
+        self.data_item.setImage(data, autoLevels=False)
+
+    def set_levels(self, color_scale):
+
+        # frames are already 8-bit display values, full scale needs no rescaling
+        self.color_scale = color_scale
+        self.levels = None if color_scale >= 255 else [0, color_scale]
+        self.data_item.setLevels(self.levels)
+        for item in self.tiles.values():
+            item.setLevels(self.levels)
+
+    def sensor_view(self, sensor_shape):
+        """Visible part of the image in sensor pixels and the sensor pixels per screen pixel
+
+        Returns:
+        --------
+        region : tuple of float
+            (x0, y0, x1, y1) in sensor pixels with y down, as in the raw frame
+        pixels_per_screen_pixel : float
+        """
+        height = self.data_item.height()
+        if not height:
+            return None, None
+        x_scale = sensor_shape[1] / self.data_item.width()
+        y_scale = sensor_shape[0] / height
+        (x0, x1), (y0, y1) = self.view_box.viewRange()
+        region = (x0 * x_scale, y0 * y_scale, x1 * x_scale, y1 * y_scale)
+        return region, self.view_box.viewPixelSize()[1] * y_scale
+
+    def draw_tile(self, tile, image, region, sensor_shape):
+        """Draw a detail tile over the overview at the sensor pixel region (x, y, width, height) it covers"""
+
+        item = self.tiles.get(tile)
+        if item is None:
+            item = pg.ImageItem()
+            item.setZValue(1)
+            self.view_box.addItem(item)
+            self.tiles[tile] = item
+        item.setImage(image, autoLevels=False, levels=self.levels)
+        x_scale = self.data_item.width() / sensor_shape[1]
+        y_scale = self.data_item.height() / sensor_shape[0]
+        x, y, width, height = region
+        item.setRect(pg.QtCore.QRectF(x * x_scale, y * y_scale, width * x_scale, height * y_scale))
+        item.show()
+
+    def remove_tiles(self, keep=()):
+        """Remove the detail tiles that are not in keep"""
+
+        for tile in list(self.tiles):
+            if tile not in keep:
+                self.view_box.removeItem(self.tiles.pop(tile))
+
+def raw_image_widget(opengl=False):
+    """RawImageWidget for RawImageDisplay, or RawImageGLWidget if asked for and OpenGL is available"""
+
+    from pyqtgraph.widgets.RawImageWidget import RawImageWidget, RawImageGLWidget
+
+    if opengl:
+        try:
+            return RawImageGLWidget()
+        except Exception as e:
+            LOG.warning('OpenGL display is not available, using RawImageWidget: ' + repr(e))
+    return RawImageWidget(scaled=True)
+
+
+class RawImageDisplay:
+    """Frame display on a RawImageWidget or RawImageGLWidget, with the interface of ImageDisplay
+
+    The widget paints each frame straight to the screen, scaled to fit, without the scene
+    graph of a view box. There is no zoom, line tool or detail tiles.
+    """
+
+    def __init__(self, widget):
+        self.widget = widget
+        self.view_box = None
+        self.line_tool = None
+        self.tiles = {}
+        self.color_scale = 255
+        self.levels = None
+
+    def get_line(self, image):
+        return None
+
+    def draw(self, data, color_scale=255, size_scale=1):
+
+        self.color_scale = color_scale
+        self.levels = None if color_scale >= 255 else [0, color_scale]
+        if self.levels is None:
+            self.widget.setImage(data)
+        else:
+            self.widget.setImage(data, levels=self.levels)
+
+    def set_levels(self, color_scale):
+        self.color_scale = color_scale
+        self.levels = None if color_scale >= 255 else [0, color_scale]
+
+    def sensor_view(self, sensor_shape):
+        return None, None
+
+    def draw_tile(self, tile, image, region, sensor_shape):
+        pass
+
+    def remove_tiles(self, keep=()):
+        pass
+
 
 class ImageView:
 
@@ -57,3 +168,32 @@ class ImageView:
         output = cv2.transpose(data)
         self.image_view.setImage(output)
 
+
+class ContactSheet(pg.GraphicsLayoutWidget):
+    """Window with a grid of thumbnails, clicking a thumbnail emits its frame index"""
+
+    frameClicked = pg.QtCore.Signal(int)
+
+    def __init__(self, thumbnails, columns=10):
+        pg.GraphicsLayoutWidget.__init__(self)
+        self.setWindowTitle('Contact Sheet - ' + thumbnails.raw_image.filepath)
+        self.columns = columns
+        self.spacing = 2
+        self.sheet, self.frames = thumbnails.contact_sheet(columns, spacing=self.spacing)
+        self.cell_height, self.cell_width = thumbnails.images.shape[1:3]
+
+        self.view_box = self.addViewBox()
+        self.view_box.setAspectLocked(True)
+        self.view_box.invertY(True)
+        self.data_item = pg.ImageItem(self.sheet, autoLevels=False, levels=[0, 255])
+        self.view_box.addItem(self.data_item)
+        self.scene().sigMouseClicked.connect(self.mouseClicked)
+        self.resize(self.sheet.shape[1] + 20, min(self.sheet.shape[0], 800) + 20)
+
+    def mouseClicked(self, event):
+        pos = self.view_box.mapSceneToView(event.scenePos())
+        column = int(pos.x() - self.spacing) // (self.cell_width + self.spacing)
+        row = int(pos.y() - self.spacing) // (self.cell_height + self.spacing)
+        cell = row * self.columns + column
+        if 0 <= column < self.columns and 0 <= cell < len(self.frames) and pos.y() >= 0:
+            self.frameClicked.emit(int(self.frames[cell]))
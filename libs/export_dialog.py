@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+export_dialog.py -- dialog to choose which frames and pixels of a bin file to export
+Author Paul L. D. Roberts
+Copyright 2020  Scripps Institution of Oceanography
+Distributed under MIT license. See license.txt for more information.
+"""
+
+from pyqtgraph.Qt import QtWidgets
+from libs.file_tools import parse_time
+from libs.tiff_tools import COMPRESSION_TYPES
+
+
+class ExportOptionsDialog(QtWidgets.QDialog):
+    """Frame range, stride, time window, region and binning for an export
+
+    The defaults export every frame at full resolution, the same as the command line
+    without any selection options.
+    """
+
+    def __init__(self, parent, frames, width, height):
+        QtWidgets.QDialog.__init__(self, parent)
+        self.setWindowTitle('Export Options')
+
+        last_frame = max(frames - 1, 0)
+        self.startFrameSpinBox = self.spin_box(0, last_frame, 0)
+        self.stopFrameSpinBox = self.spin_box(1, max(frames, 1), max(frames, 1))
+        self.strideSpinBox = self.spin_box(1, max(frames, 1), 1)
+        self.startTimeEdit = QtWidgets.QLineEdit()
+        self.endTimeEdit = QtWidgets.QLineEdit()
+        self.startTimeEdit.setPlaceholderText('YYYY-MM-DD HH:MM:SS or unix seconds (UTC)')
+        self.endTimeEdit.setPlaceholderText('YYYY-MM-DD HH:MM:SS or unix seconds (UTC)')
+
+        self.roiCheckBox = QtWidgets.QCheckBox('Crop to region')
+        self.roiXSpinBox = self.spin_box(0, width, 0)
+        self.roiYSpinBox = self.spin_box(0, height, 0)
+        self.roiWidthSpinBox = self.spin_box(2, width, width)
+        self.roiHeightSpinBox = self.spin_box(2, height, height)
+        self.binningSpinBox = self.spin_box(1, 16, 1)
+
+        self.compressionComboBox = QtWidgets.QComboBox()
+        self.compressionComboBox.addItems(COMPRESSION_TYPES)
+
+        roi_layout = QtWidgets.QHBoxLayout()
+        for label, spin_box in [('x', self.roiXSpinBox), ('y', self.roiYSpinBox),
+                                ('w', self.roiWidthSpinBox), ('h', self.roiHeightSpinBox)]:
+            roi_layout.addWidget(QtWidgets.QLabel(label))
+            roi_layout.addWidget(spin_box)
+
+        form = QtWidgets.QFormLayout()
+        form.addRow('First frame', self.startFrameSpinBox)
+        form.addRow('Stop before frame', self.stopFrameSpinBox)
+        form.addRow('Every Nth frame', self.strideSpinBox)
+        form.addRow('Start time', self.startTimeEdit)
+        form.addRow('End time', self.endTimeEdit)
+        form.addRow(self.roiCheckBox, roi_layout)
+        form.addRow('Binning', self.binningSpinBox)
+        form.addRow('Compression', self.compressionComboBox)
+
+        buttons = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addLayout(form)
+        layout.addWidget(buttons)
+
+    def spin_box(self, minimum, maximum, value):
+        spin_box = QtWidgets.QSpinBox()
+        spin_box.setRange(minimum, maximum)
+        spin_box.setValue(value)
+        return spin_box
+
+    def options(self):
+        """Selection for select_frames and options for export_as_tiff, raises ValueError on a bad time"""
+
+        selection = {
+            'start': self.startFrameSpinBox.value(),
+            'stop': self.stopFrameSpinBox.value(),
+            'step': self.strideSpinBox.value()
+        }
+        if self.startTimeEdit.text().strip():
+            selection['start_time'] = parse_time(self.startTimeEdit.text().strip())
+        if self.endTimeEdit.text().strip():
+            selection['end_time'] = parse_time(self.endTimeEdit.text().strip())
+
+        export_options = {
+            'compression': self.compressionComboBox.currentText(),
+            'binning': self.binningSpinBox.value(),
+            'roi': None
+        }
+        if self.roiCheckBox.isChecked():
+            export_options['roi'] = (self.roiXSpinBox.value(), self.roiYSpinBox.value(),
+                                     self.roiWidthSpinBox.value(), self.roiHeightSpinBox.value())
+        return selection, export_options
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+export_tools.py -- batch export of BUMP bin files to tiff using a pool of worker processes
+Author Paul L. D. Roberts
+Copyright 2020  Scripps Institution of Oceanography
+Distributed under MIT license. See license.txt for more information.
+"""
+
+import os
+import json
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from libs.raw_image import RawImage
+from libs.raw_image_collection import RawImageCollection
+from libs.logger import LOG
+
+# written to each output directory, lists the bin files exported there
+MANIFEST_NAME = 'export_manifest.json'
+
+
+class ExportManifest:
+    """Record of the bin files exported to one directory so re-runs only export new data
+
+    Each entry is keyed by bin file path and holds the size and mtime of the bin file when
+    it was exported, the frames done out of the frames selected, the output tiff and the
+    export options. A file is skipped if all of these still match and the tiff exists.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self.entries = json.load(f)['files']
+            except (OSError, ValueError, KeyError) as e:
+                LOG.warning('Ignoring unreadable export manifest ' + self.path + ': ' + str(e))
+
+    def is_complete(self, bin_path, options):
+
+        entry = self.entries.get(bin_path)
+        if entry is None or not entry['complete'] or entry['options'] != options:
+            return False
+        stat = os.stat(bin_path)
+        return (entry['size'], entry['mtime_ns']) == (stat.st_size, stat.st_mtime_ns) and os.path.exists(entry['output'])
+
+    def update(self, result, options):
+
+        self.entries[result['bin_path']] = {
+            'size': result['size'],
+            'mtime_ns': result['mtime_ns'],
+            'frames_done': result['frames_done'],
+            'frames_total': result['frames_total'],
+            'output': result['output'],
+            'complete': result['ok'],
+            'options': options
+        }
+
+    def save(self):
+
+        # replace the whole file so an interrupted run never leaves a truncated manifest
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'files': self.entries}, f, indent=4, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            LOG.error('Could not write export manifest ' + self.path + ': ' + str(e))
+
+
+def manifest_options(export_options, selection):
+    """Export options and frame selection as stored in the manifest, in their JSON form"""
+
+    options = {k: v for k, v in export_options.items() if k != 'workers'}
+    options['selection'] = selection or {}
+    return json.loads(json.dumps(options, sort_keys=True))
+
+
+def sequence_selections(bin_files, selection=None):
+    """Frame selection of each bin file when the files are exported as one sequence
+
+    The frame range and stride of selection count frames through the whole sequence, in
+    the order the files were recorded, so each file gets the part of the range that falls
+    in it. The time window is the same for every file. Files with no frames in the range
+    are left out.
+
+    Returns:
+    --------
+    selections : dict
+        Selection for RawImage.select_frames keyed by bin file path, in recording order
+    """
+    selection = dict(selection or {})
+    start, stop = selection.pop('start', None), selection.pop('stop', None)
+
+    collection = RawImageCollection(bin_files)
+    frames = np.arange(collection.frames_in_file)[slice(start, stop, selection.get('step'))]
+    selections = {}
+    for file_index, bin_file in enumerate(collection.bin_files):
+        first, end = collection.file_offsets[file_index], collection.file_offsets[file_index + 1]
+        local = frames[(frames >= first) & (frames < end)] - first
+        if len(local) > 0:
+            selections[bin_file] = dict(selection, start=int(local[0]), stop=int(local[-1]) + 1)
+    collection.close()
+    return selections
+
+
+def export_bin_file(bin_path, output_path=None, export_options=None, selection=None, resume=True):
+    """Export a single bin file, run inside a worker process
+
+    Parameters:
+    -----------
+    bin_path : str
+        Path to the bin file to export
+    output_path : str, optional
+        Directory to write the tiff and json files to instead of next to the bin file
+    export_options : dict, optional
+        Keyword arguments for RawImage.export_as_tiff (compression, tile, workers, roi, binning)
+    selection : dict, optional
+        Keyword arguments for RawImage.select_frames (start, stop, step, start_time, end_time)
+    resume : bool
+        Continue an interrupted export of the file, see RawImage.export_as_tiff
+
+    Returns:
+    --------
+    result : dict
+        bin_path, ok, frames and bytes written by this run, seconds, error (None on success),
+        no_frames (True if the selection is empty and nothing was written), and for the
+        manifest size, mtime_ns, frames_done, frames_total and output
+    """
+    result = {
+        'bin_path': bin_path,
+        'ok': False,
+        'frames': 0,
+        'bytes': 0,
+        'seconds': 0.0,
+        'error': None,
+        'no_frames': False,
+        'size': None,
+        'mtime_ns': None,
+        'frames_done': 0,
+        'frames_total': None,
+        'output': None
+    }
+    export_options = export_options or {}
+    start = time.time()
+    rw = None
+    try:
+        rw = RawImage(bin_path, use_mmap=True, use_index=True)
+        if not rw.file_valid:
+            raise IOError('Could not open ' + bin_path)
+        result['size'], result['mtime_ns'] = rw.index_key()
+        frames = rw.select_frames(**(selection or {}))
+        result['frames_total'] = len(frames)
+        if len(frames) == 0:
+            # nothing is written, and without an output there is no manifest entry
+            result['no_frames'] = True
+        else:
+            result['output'] = rw.export_paths(output_path)[0]
+            resumed = rw.export_as_tiff(output_path=output_path, frames=frames, resume=resume, **export_options)
+            result['frames'] = len(frames) - resumed
+            result['bytes'] = result['frames'] * rw.export_frame_bytes(export_options.get('roi'),
+                                                                       export_options.get('binning', 1))
+            result['frames_done'] = len(frames)
+        result['ok'] = True
+    except Exception as e:
+        result['error'] = repr(e)
+        progress = rw.export_progress(output_path) if rw is not None and rw.file_valid else None
+        if progress is not None:
+            result['frames_done'] = progress['frames_done']
+    if rw is not None:
+        rw.close()
+    result['seconds'] = time.time() - start
+    return result
+
+
+def batch_export(bin_files, output_path=None, jobs=None, compression=None, tile=None, selection=None,
+                 roi=None, binning=1, force=False, continuous=False):
+    """Export bin files with a bounded pool of worker processes and wait for all of them
+
+    Files the export manifest of their output directory lists as done with the same options
+    are skipped, and interrupted exports are resumed, unless force is set.
+
+    Parameters:
+    -----------
+    bin_files : list of str
+        Paths to the bin files to export
+    output_path : str, optional
+        Directory to write the exported files to instead of next to each bin file
+    jobs : int, optional
+        Number of worker processes, defaults to the number of CPUs
+    compression : {None, 'none', 'zlib', 'deflate', 'lzw'}
+        Lossless compression for the exported tiffs
+    tile : int, optional
+        Write square tiles of this size instead of strips
+    selection : dict, optional
+        Frame range, stride and time window applied to every file, see RawImage.select_frames
+    roi : tuple of int, optional
+        Pixel region (x, y, width, height) to export from every frame
+    binning : int
+        Bayer plane binning factor, see RawImage.export_as_tiff
+    force : bool
+        Export every file again from the start, ignoring the manifest
+    continuous : bool
+        Apply the frame range of selection to all files as one sequence, see sequence_selections
+
+    Returns:
+    --------
+    results : list of dict
+        One result per exported bin file as returned by export_bin_file
+    """
+    if jobs is None or jobs < 1:
+        jobs = os.cpu_count() or 1
+
+    # split the CPUs between processes for the compression thread pools
+    export_options = {
+        'compression': compression,
+        'tile': (tile, tile) if tile else None,
+        'workers': max((os.cpu_count() or 1) // jobs, 1),
+        'roi': roi,
+        'binning': binning
+    }
+    if continuous:
+        selections = sequence_selections(bin_files, selection)
+        bin_files = list(selections)
+    else:
+        selections = {bin_file: selection for bin_file in bin_files}
+
+    if output_path is not None:
+        os.makedirs(output_path, exist_ok=True)
+
+    manifests = {}
+    todo = []
+    for bin_file in bin_files:
+        manifest_dir = output_path if output_path is not None else os.path.dirname(bin_file)
+        if manifest_dir not in manifests:
+            manifests[manifest_dir] = ExportManifest(os.path.join(manifest_dir, MANIFEST_NAME))
+        options = manifest_options(export_options, selections[bin_file])
+        if not force and manifests[manifest_dir].is_complete(bin_file, options):
+            LOG.info('Skipping ' + bin_file + ', already exported')
+            continue
+        todo.append((bin_file, manifests[manifest_dir], options))
+
+    jobs = min(jobs, max(len(todo), 1))
+    LOG.info('Exporting ' + str(len(todo)) + ' bin files with ' + str(jobs) + ' worker(s)')
+
+    results = []
+    no_frames = 0
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(export_bin_file, bin_file, output_path, export_options, selections[bin_file],
+                               not force): (manifest, options)
+                   for bin_file, manifest, options in todo}
+        for future in as_completed(futures):
+            result = future.result()
+            if result['no_frames']:
+                LOG.info('Skipping ' + result['bin_path'] + ', no frames selected')
+                no_frames += 1
+                continue
+            results.append(result)
+            if result['ok']:
+                LOG.info('Exported ' + result['bin_path'] + ': ' + str(result['frames']) + ' frames in ' +
+                         '%.2f' % result['seconds'] + ' s')
+            else:
+                LOG.error('Failed to export ' + result['bin_path'] + ': ' + str(result['error']))
+            if result['output'] is not None:
+                manifest, options = futures[future]
+                manifest.update(result, options)
+                manifest.save()
+
+    log_summary(results, time.time() - start, len(bin_files) - len(todo) + no_frames)
+    return results
+
+
+def log_summary(results, elapsed, skipped=0):
+
+    failed = [r for r in results if not r['ok']]
+    frames = sum(r['frames'] for r in results)
+    megabytes = sum(r['bytes'] for r in results) / 1e6
+    elapsed = max(elapsed, 1e-9)
+
+    LOG.info('Export finished: ' + str(len(results) - len(failed)) + ' succeeded, ' +
+             str(len(failed)) + ' failed, ' + str(skipped) + ' skipped, ' +
+             str(frames) + ' frames, ' + '%.1f' % megabytes + ' MB in ' +
+             '%.1f' % elapsed + ' s (' + '%.1f' % (megabytes / elapsed) + ' MB/s, ' +
+             '%.1f' % (frames / elapsed) + ' frames/s)')
+    for r in failed:
+        LOG.error('  failed: ' + r['bin_path'])
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+file_tools.py -- find BUMP bin files in files and directories
+Author Paul L. D. Roberts
+Copyright 2020  Scripps Institution of Oceanography
+Distributed under MIT license. See license.txt for more information.
+"""
+
+import os
+import glob
+import datetime
+
+
+def find_bin_files(paths):
+    """Expand bin files and directories (searched recursively) into a sorted list of bin files"""
+
+    bin_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            bin_files += glob.glob(os.path.join(path, '**', '*.bin'), recursive=True)
+        elif os.path.exists(path):
+            bin_files.append(path)
+    return sorted(set(bin_files))
+
+
+def scan_bin_files(path, cancelled=None):
+    """Walk path with os.scandir and yield bin files as they are found, in sorted order
+    within each directory
+
+    Parameters:
+    -----------
+    path : str
+        Directory to search recursively
+    cancelled : callable, optional
+        Checked between directory entries, the walk stops when it returns True
+    """
+    stack = [path]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            if cancelled is not None and cancelled():
+                return
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif entry.name.endswith('.bin') and entry.is_file():
+                yield entry.path
+        stack.extend(reversed(subdirs))
+
+
+def format_time(timestamp):
+    if timestamp is None:
+        return '-'
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+
+def parse_time(text):
+    """Parse unix seconds or an ISO 8601 date and time (UTC unless it has an offset)
+
+    Returns:
+    --------
+    timestamp : float
+        Unix time in seconds
+
+    Raises:
+    -------
+    ValueError
+        If text is neither a number nor an ISO 8601 time
+    """
+    text = text.strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    dt = datetime.datetime.fromisoformat(text.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.timestamp()
+
+
+def parse_frame_range(text):
+    """Parse a START:STOP frame range where either side may be empty, returns (start, stop)"""
+
+    parts = text.split(':')
+    if len(parts) != 2:
+        raise ValueError('Frame range must be START:STOP, got ' + text)
+    return tuple(int(p) if p.strip() else None for p in parts)
+
+
+def parse_roi(text):
+    """Parse an X,Y,WIDTH,HEIGHT pixel region, returns a tuple of 4 ints"""
+
+    parts = text.split(',')
+    if len(parts) != 4:
+        raise ValueError('Region must be X,Y,WIDTH,HEIGHT, got ' + text)
+    return tuple(int(p) for p in parts)
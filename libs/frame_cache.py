@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+frame_cache.py -- thread safe LRU cache of frames bounded by a memory budget in bytes
+Author Paul L. D. Roberts
+Copyright 2020  Scripps Institution of Oceanography
+Distributed under MIT license. See license.txt for more information.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class FrameCache:
+
+    def __init__(self, max_bytes, name='frames'):
+
+        self.name = name
+        self.max_bytes = int(max_bytes)
+        self.used_bytes = 0
+        self.last_item_bytes = 0
+        self.frames = OrderedDict()
+        self.lock = threading.Lock()
+
+        # counters exposed through stats()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, index):
+
+        with self.lock:
+            return index in self.frames
+
+    def __len__(self):
+
+        return len(self.frames)
+
+    def get(self, index):
+        """Return the cached frame and mark it most recently used, or None on a miss"""
+
+        with self.lock:
+            frame = self.frames.get(index)
+            if frame is None:
+                self.misses += 1
+                return None
+            self.frames.move_to_end(index)
+            self.hits += 1
+            return frame
+
+    def put(self, index, frame):
+        """Add a frame, evicting least recently used frames until it fits in the budget"""
+
+        size = frame.nbytes
+        with self.lock:
+            self.last_item_bytes = size
+            if index in self.frames:
+                self.used_bytes -= self.frames.pop(index).nbytes
+            if size > self.max_bytes:
+                return
+            while self.used_bytes + size > self.max_bytes and self.frames:
+                _, evicted = self.frames.popitem(last=False)
+                self.used_bytes -= evicted.nbytes
+                self.evictions += 1
+            self.frames[index] = frame
+            self.used_bytes += size
+
+    def clear(self):
+
+        with self.lock:
+            self.frames.clear()
+            self.used_bytes = 0
+
+    def stats(self):
+
+        with self.lock:
+            return {
+                'name': self.name,
+                'frames': len(self.frames),
+                'used_bytes': self.used_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
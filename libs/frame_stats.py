@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+frame_stats.py -- per-frame exposure statistics of a bin file, cached next to the file
+Author Paul L. D. Roberts
+Copyright 2020  Scripps Institution of Oceanography
+Distributed under MIT license. See license.txt for more information.
+"""
+
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from libs.logger import LOG
+from libs.sidecar import sidecar_path, load_sidecar, save_sidecar
+
+# bump when the contents of the stats file change so old files get recomputed
+STATS_VERSION = 1
+
+# every Nth 2x2 Bayer cell in each direction is used by default, 1 uses every pixel
+DEFAULT_SUBSAMPLE = 4
+HISTOGRAM_BINS = 256
+PERCENTILES = (0.1, 1, 5, 50, 95, 99, 99.9)
+
+# frames per task on the thread pool
+CHUNK_FRAMES = 16
+
+
+class FrameStats:
+    """Histogram, mean, percentiles, saturated fraction and Bayer channel means of every frame
+
+    Frames are read through the reader's memory map, and with subsampling only the rows
+    that are used are paged in. Chunks of frames are processed on a thread pool. Results
+    are saved to <bin file>.stats.npz, keyed on the size and mtime of the bin file and on
+    the subsampling, and loaded from there the next time.
+
+    Attributes, one row per frame, after compute or load:
+        mean, saturated (fraction of pixels at the largest code value),
+        percentiles (one column per PERCENTILES value), channel_means (blue, green1, green2,
+        red, matching image_tools.bayer_planes) and histogram (HISTOGRAM_BINS bins over the
+        full range of the pixel format)
+    """
+
+    def __init__(self, raw_image, subsample=DEFAULT_SUBSAMPLE, workers=None, cancelled=None):
+
+        self.raw_image = raw_image
+        self.subsample = max(int(subsample), 1)
+        if workers is None or workers < 1:
+            workers = os.cpu_count() or 1
+        self.workers = workers
+        self.cancelled = cancelled
+
+        self.stats_path = sidecar_path(raw_image, '.stats.npz')
+
+        self.bits = 8 * raw_image.file_header['pixel_format']
+        self.mean = None
+        self.saturated = None
+        self.percentiles = None
+        self.channel_means = None
+        self.histogram = None
+
+    def get(self):
+        """Load the cached stats, or compute and cache them, None if cancelled while computing"""
+
+        if not self.load():
+            self.compute()
+            if self.is_cancelled():
+                return None
+            self.save()
+        return self
+
+    def is_cancelled(self):
+        return self.cancelled is not None and self.cancelled()
+
+    def frame_stats(self, data):
+        """Statistics of one frame, returns (mean, saturated, percentiles, channel_means, histogram)"""
+
+        height, width = data.shape
+        step = self.subsample
+        cells = data[:height // 2 * 2, :width // 2 * 2].reshape(height // 2, 2, width // 2, 2)[::step, :, ::step, :]
+        planes = [cells[:, 0, :, 0], cells[:, 0, :, 1], cells[:, 1, :, 0], cells[:, 1, :, 1]]
+
+        values = np.ascontiguousarray(cells).ravel()
+        channel_means = [float(np.mean(p)) for p in planes]
+        histogram = np.bincount(values >> (self.bits - 8), minlength=HISTOGRAM_BINS)
+        saturated = np.count_nonzero(values == 2**self.bits - 1) / values.size
+
+        return (float(np.mean(values)), saturated, np.percentile(values, PERCENTILES),
+                channel_means, histogram)
+
+    def compute_chunk(self, start, stop):
+
+        for index in range(start, stop):
+            if self.is_cancelled():
+                return
+            frame = self.raw_image.read_frame(index)
+            if frame is None:
+                continue
+            (self.mean[index], self.saturated[index], self.percentiles[index],
+             self.channel_means[index], self.histogram[index]) = self.frame_stats(frame[1])
+
+    def compute(self):
+
+        frames = self.raw_image.frames_in_file
+        self.mean = np.zeros(frames)
+        self.saturated = np.zeros(frames)
+        self.percentiles = np.zeros((frames, len(PERCENTILES)))
+        self.channel_means = np.zeros((frames, 4))
+        self.histogram = np.zeros((frames, HISTOGRAM_BINS), dtype=np.uint32)
+
+        LOG.info('Computing frame statistics for ' + str(frames) + ' frames of ' + self.raw_image.filepath)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            chunks = [pool.submit(self.compute_chunk, start, min(start + CHUNK_FRAMES, frames))
+                      for start in range(0, frames, CHUNK_FRAMES)]
+            for chunk in chunks:
+                chunk.result()
+
+    def cache_key(self):
+
+        file_size, mtime_ns = self.raw_image.index_key()
+        return STATS_VERSION, file_size, mtime_ns, self.subsample
+
+    def load(self):
+        """Load the stats file if it matches the bin file and subsampling, returns True if loaded"""
+
+        if self.stats_path is None:
+            return False
+        stats = load_sidecar(self.stats_path, self.cache_key(), 'frame statistics')
+        if stats is None:
+            return False
+        try:
+            self.mean = stats['mean']
+            self.saturated = stats['saturated']
+            self.percentiles = stats['percentiles']
+            self.channel_means = stats['channel_means']
+            self.histogram = stats['histogram']
+        except KeyError as e:
+            LOG.warning('Could not read frame statistics ' + self.stats_path + ': ' + str(e))
+            return False
+        return True
+
+    def save(self):
+
+        if self.stats_path is None:
+            return
+        save_sidecar(
+            self.stats_path,
+            self.cache_key(),
+            'frame statistics',
+            mean=self.mean,
+            saturated=self.saturated,
+            percentiles=self.percentiles,
+            channel_means=self.channel_means,
+            histogram=self.histogram
+        )
+
+    def levels(self, low=1, high=99.9, index=None):
+        """Display black and white levels from the percentiles of one frame or the whole file
+
+        Parameters:
+        -----------
+        low, high : float
+            Percentiles to map to black and white, must be in PERCENTILES
+        index : int, optional
+            Frame to use, by default the median over all frames so a few bad frames
+            do not change the levels
+
+        Returns:
+        --------
+        black, white : int
+        """
+        low_column = self.percentiles[:, PERCENTILES.index(low)]
+        high_column = self.percentiles[:, PERCENTILES.index(high)]
+        if index is None:
+            black, white = np.median(low_column), np.median(high_column)
+        else:
+            black, white = low_column[index], high_column[index]
+        return int(black), max(int(np.ceil(white)), int(black) + 1)
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+image_tools.py -- fast conversion of raw Bayer frames into downscaled RGB display images
+Author Paul L. D. Roberts
+Copyright 2020  Scripps Institution of Oceanography
+Distributed under MIT license. See license.txt for more information.
+"""
+
+import sys
+import cv2
+import numpy as np
+
+
+def high_bytes(frame):
+    """Zero-copy view of the most significant byte of each pixel of a 16-bit frame
+
+    This is the same as frame >> 8 without any arithmetic or temporary arrays.
+    """
+    little_endian = frame.dtype.byteorder == '<' or (frame.dtype.byteorder == '=' and sys.byteorder == 'little')
+    if little_endian:
+        return frame.view(np.uint8)[:, 1::2]
+    return frame.view(np.uint8)[:, 0::2]
+
+
+def bayer_planes(frame):
+    """Views of the blue, first green, second green and red sites of the Bayer mosaic
+
+    The site layout matches cv2.COLOR_BayerRG2BGR, which puts blue at the top left.
+    """
+    return frame[0::2, 0::2], frame[0::2, 1::2], frame[1::2, 0::2], frame[1::2, 1::2]
+
+
+class DisplayTransform:
+    """Window, gamma and white balance mapping from raw pixel values to 8-bit display values
+
+    The mapping is precomputed as one lookup table per Bayer channel for each input bit
+    depth, so applying it costs a single table lookup per pixel.
+    """
+
+    def __init__(self, black=0, white=None, gamma=1.0, red_gain=1.0, blue_gain=1.0):
+
+        self.black = black
+        self.white = white
+        self.gamma = gamma
+        self.red_gain = red_gain
+        self.blue_gain = blue_gain
+        self.tables = {}
+
+    def is_identity(self, bits):
+        # a plain reduction to the top 8 bits, which the decoder does without tables
+        white = self.white if self.white is not None else 2**bits - 1
+        return (self.black == 0 and white == 2**bits - 1 and self.gamma == 1.0 and
+                self.red_gain == 1.0 and self.blue_gain == 1.0)
+
+    def lut(self, bits, gain):
+
+        levels = np.arange(2**bits, dtype=np.float64) * gain
+        white = self.white if self.white is not None else 2**bits - 1
+        scaled = np.clip((levels - self.black) / max(white - self.black, 1), 0, 1)
+        if self.gamma != 1.0:
+            scaled = scaled ** (1.0 / self.gamma)
+        return (scaled * 255 + 0.5).astype(np.uint8)
+
+    def luts(self, bits):
+        """Blue, green and red lookup tables for frames with the given bits per pixel"""
+
+        if bits not in self.tables:
+            self.tables[bits] = (
+                self.lut(bits, self.blue_gain),
+                self.lut(bits, 1.0),
+                self.lut(bits, self.red_gain)
+            )
+        return self.tables[bits]
+
+
+class DisplayDecoder:
+
+    def __init__(self, target_height=1080, transform=None):
+
+        self.target_height = target_height
+        self.transform = transform
+        # intermediate buffers reused from frame to frame, keyed by name
+        self.buffers = {}
+
+    def buffer(self, name, shape, dtype):
+
+        buf = self.buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = np.empty(shape, dtype=dtype)
+            self.buffers[name] = buf
+        return buf
+
+    def output_size(self, shape):
+
+        scale = self.target_height / shape[0]
+        return int(shape[1] * scale), int(shape[0] * scale)
+
+    def decode(self, frame):
+        """Convert a raw Bayer frame to a BGR uint8 image target_height rows high
+
+        When the target is at most half the sensor height, each 2x2 Bayer cell becomes one
+        output pixel (superpixel demosaic) so no work is spent on pixels the downscale would
+        discard. Otherwise the frame is demosaiced at full resolution. Without a display
+        transform 16-bit frames are reduced to 8 bits by taking the high byte, otherwise
+        the transform lookup tables map each Bayer site straight to 8 bits.
+        """
+        bits = 8 * frame.dtype.itemsize
+        superpixel = frame.shape[0] >= 2 * self.target_height
+
+        if self.transform is None or self.transform.is_identity(bits):
+            if bits == 16:
+                frame = high_bytes(frame)
+            if superpixel:
+                image = self.superpixel(frame)
+            else:
+                image = self.demosaic(frame)
+        else:
+            if superpixel:
+                image = self.superpixel_lut(frame, self.transform.luts(bits))
+            else:
+                image = self.demosaic_lut(frame, self.transform.luts(bits))
+
+        size = self.output_size(frame.shape)
+        if (image.shape[1], image.shape[0]) == size:
+            return image.copy()
+        return cv2.resize(image, size)
+
+    def superpixel(self, frame):
+
+        blue, green1, green2, red = bayer_planes(frame)
+        shape = blue.shape
+        image = self.buffer('superpixel', shape + (3,), np.uint8)
+        green = self.buffer('green', shape, np.uint16)
+
+        image[..., 0] = blue
+        np.add(green1, green2, out=green, dtype=np.uint16)
+        np.right_shift(green, 1, out=green)
+        image[..., 1] = green
+        image[..., 2] = red
+        return image
+
+    def demosaic(self, frame):
+
+        if frame.flags['C_CONTIGUOUS']:
+            bayer = frame
+        else:
+            bayer = self.buffer('bayer', frame.shape, np.uint8)
+            np.copyto(bayer, frame)
+        image = self.buffer('demosaic', frame.shape + (3,), np.uint8)
+        cv2.cvtColor(bayer, cv2.COLOR_BayerRG2BGR, dst=image)
+        return image
+
+    def superpixel_lut(self, frame, luts):
+
+        blue, green1, green2, red = bayer_planes(frame)
+        shape = blue.shape
+        image = self.buffer('superpixel', shape + (3,), np.uint8)
+        green = self.buffer('green_sum', shape, np.uint32)
+
+        # average the raw greens before the lookup so the curve is applied once
+        np.add(green1, green2, out=green, dtype=np.uint32)
+        np.right_shift(green, 1, out=green)
+        image[..., 0] = luts[0][blue]
+        image[..., 1] = luts[1][green]
+        image[..., 2] = luts[2][red]
+        return image
+
+    def demosaic_lut(self, frame, luts):
+
+        bayer = self.buffer('bayer', frame.shape, np.uint8)
+        blue, green1, green2, red = bayer_planes(frame)
+        bayer_blue, bayer_green1, bayer_green2, bayer_red = bayer_planes(bayer)
+        bayer_blue[...] = luts[0][blue]
+        bayer_green1[...] = luts[1][green1]
+        bayer_green2[...] = luts[1][green2]
+        bayer_red[...] = luts[2][red]
+
+        image = self.buffer('demosaic', frame.shape + (3,), np.uint8)
+        cv2.cvtColor(bayer, cv2.COLOR_BayerRG2BGR, dst=image)
+        return image
@@ -13,13 +13,13 @@ import logging
 LOG_FILE_HANDLER = None
 LOG_CONSOLE_HANDLER = None
 
-def get_logger(filepath,file_level=logging.DEBUG, console_level=logging.WARN,logger_name=''):
+def get_logger(filepath=None, file_level=logging.DEBUG, console_level=logging.WARN, logger_name=''):
     """Get a logger object initialized with console and file output
 
     Parameters:
     -----------
-    filepath : str
-        The absolue path to the file for the FileHandler
+    filepath : str, optional
+        The absolue path to the file for the FileHandler, no file is written if None
     log_level : {'DEBUG', 'INFO', 'WARNING','ERROR','CRITICAL'}
         The log level for the logger,
     logger_name : str, optional
@@ -39,35 +39,50 @@ def get_logger(filepath,file_level=logging.DEBUG, console_level=logging.WARN,log
     ch = logging.StreamHandler()
     ch.setLevel(console_level)
 
-    fh = logging.FileHandler(filepath)
-    fh.setLevel(file_level)
-
     # create formatter
     formatter = logging.Formatter(
         '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
     # add formatter to ch
     ch.setFormatter(formatter)
-    fh.setFormatter(formatter)
 
     # add ch to lgr
     lgr.addHandler(ch)
-    lgr.addHandler(fh)
 
     global LOG_CONSOLE_HANDLER
     LOG_CONSOLE_HANDLER = ch
 
+    if filepath is not None:
+        add_file_handler(lgr, filepath, file_level)
+
+    return lgr
+
+
+def add_file_handler(lgr, filepath, file_level=logging.DEBUG):
+    """Add a FileHandler writing to filepath, creating its directory if needed"""
+
+    log_dir = os.path.dirname(filepath)
+    if log_dir and not os.path.exists(log_dir):
+        os.makedirs(log_dir)
+
+    fh = logging.FileHandler(filepath)
+    fh.setLevel(file_level)
+    fh.setFormatter(logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    lgr.addHandler(fh)
+
     global LOG_FILE_HANDLER
     LOG_FILE_HANDLER = fh
 
+    return fh
 
-    return lgr
 
-# create a logs dir if it does not exist
-if not os.path.exists('logs'):
-    os.makedirs('logs')
+def log_to_dir(log_dir='logs'):
+    """Also write the log to a new timestamped file in log_dir, called by the entry points
+    so that importing the libs has no side effects on the file system"""
+
+    return add_file_handler(LOG, os.path.join(log_dir, str(int(time.time())) + '.log'))
+
 
-LOG = get_logger(os.path.join('logs', str(int(time.time())) + '.log'),
-                 file_level=logging.DEBUG,
-                 console_level=logging.WARN,
+LOG = get_logger(console_level=logging.WARN,
                  logger_name='BUMP Image')
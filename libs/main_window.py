@@ -0,0 +1,661 @@
+# -*- coding: utf-8 -*-
+"""
+main_window.py -- Qt main window for viewing and exporting BUMP bin files
+Author Paul L. D. Roberts
+Copyright 2020  Scripps Institution of Oceanography
+Distributed under MIT license. See license.txt for more information.
+"""
+
+import os
+import json
+import numpy as np
+import pyqtgraph as pg
+from pyqtgraph.Qt import QtCore, QtGui, QtWidgets
+from libs.logger import LOG
+from libs.display_tools import ImageDisplay, RawImageDisplay, ContactSheet, raw_image_widget
+from libs.image_tools import DisplayTransform
+from libs.thread_tools import RawImageLoader, RawImageExporter, DirectoryScanner, FrameStatsLoader, ThumbnailLoader
+from libs.file_tools import format_time, parse_time
+from libs.export_dialog import ExportOptionsDialog
+from libs.playback import PlaybackClock, PlaybackStats
+
+
+pg.mkQApp()
+
+"""
+Define main window class from template
+The .ui file is created in Qt Designer and loaded
+here. It must be in the directory above libs/.
+"""
+path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+uiFile = os.path.join(path, 'bump_image.ui')
+WindowTemplate, TemplateBaseClass = pg.Qt.loadUiType(uiFile)
+
+
+class MainWindow(TemplateBaseClass):
+
+    previousFrameSignal = QtCore.Signal(int)
+    nextFrameSignal = QtCore.Signal(int)
+    setFrameSignal = QtCore.Signal(int)
+
+    # how often a followed file is checked for new frames
+    FOLLOW_INTERVAL_MS = 250
+
+    # detail tiles are requested once the view has stopped changing for this long
+    TILE_DELAY_MS = 100
+
+    # during playback the line plot, frame header and playback readout are refreshed this often
+    PANEL_INTERVAL_MS = 250
+
+    def __init__(self, argv, display_backend='image'):
+
+        self.filepath = None
+        self.exportpath = None
+        self.bindir = None
+        self.all_bin_files = []
+        self.dir_scanner = None
+        self.playing = False
+
+
+        self.captured_clicks = None
+
+        self.frame_index = 0
+
+        TemplateBaseClass.__init__(self)
+        self.setWindowTitle('BUMP Image - Python - Qt')
+
+        self.rawImageDisplayScale = 255
+        self.lastImage = []
+        self.rawFrames = []
+
+        # Create the main window
+        self.ui = WindowTemplate()
+        self.ui.setupUi(self)
+
+        self.raw_file_handler = None
+        self.image_header = None
+        self.image = None
+
+        self.rawDataDisplay = None
+
+        # per-frame statistics, computed in the background when a file is loaded
+        self.stats_loader = None
+        self.frame_stats = None
+        self.stats_marker = None
+
+        # thumbnails for the slider preview and the contact sheet, built in the background
+        self.thumbnail_loader = None
+        self.thumbnails = None
+        self.contact_sheet = None
+        self.thumbnail_preview = QtWidgets.QLabel(self, QtCore.Qt.ToolTip)
+
+        # playback follows the wall clock, frames that are late are skipped and counted
+        self.playback_clock = None
+        self.playback_stats = PlaybackStats()
+        self.playbackStatsLabel = QtWidgets.QLabel()
+        self.ui.statusBar.addPermanentWidget(self.playbackStatsLabel)
+
+        # curves of the line plot are created once and given new data for each frame
+        self.line_curves = [self.ui.linePlot.plot(pen=pen) for pen in ('r', 'b', 'g')]
+
+        # the raw and opengl displays paint frames straight to a widget in place of the image view
+        self.rawImageWidget = None
+        if display_backend != 'image':
+            self.rawImageWidget = raw_image_widget(opengl=display_backend == 'opengl')
+            layout = self.ui.imageViewLayout
+            layout.insertWidget(layout.indexOf(self.ui.rawImageView), self.rawImageWidget)
+            self.ui.rawImageView.hide()
+
+        # setup handlers and events for UI
+        self.set_ui_handlers()
+
+        self.ui.playbackRate.setText('30.0')
+
+        # timer used to play video, call playback in a separate thread
+        self.playback_timer = QtCore.QTimer()
+        self.playback_timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.playback_timer.timeout.connect(self.playback)
+
+        # timer used to refresh the side panels at a lower rate than frames are drawn
+        self.panel_timer = QtCore.QTimer()
+        self.panel_timer.setSingleShot(True)
+        self.panel_timer.timeout.connect(self.updatePanels)
+
+        # timer used to poll a file that is still being written for new frames
+        self.follow_timer = QtCore.QTimer()
+        self.follow_timer.timeout.connect(self.followFile)
+
+        # timer used to request the detail tiles of the visible region after a zoom or pan
+        self.tile_timer = QtCore.QTimer()
+        self.tile_timer.setSingleShot(True)
+        self.tile_timer.timeout.connect(self.updateTiles)
+        self.tile_frame = None
+
+        ## build an initial namespace for console commands to be executed in (this is optional;
+        ## the user can always import these modules manually)
+        namespace = {'pg': pg, 'np': np}
+        self.ui.pythonConsole.namespace=namespace
+
+        # Show the main window
+        self.show()
+
+    def set_ui_handlers(self):
+        # UI handlers
+        self.ui.frameSelector.valueChanged.connect(self.ui.frameNumberSpinBox.setValue)
+        self.ui.frameNumberSpinBox.valueChanged.connect(self.ui.frameSelector.setValue)
+        self.ui.playButton.clicked.connect(self.togglePlay)
+        self.ui.prevButton.clicked.connect(self.prevFrame)
+        self.ui.nextButton.clicked.connect(self.nextFrame)
+        self.ui.exportButton.clicked.connect(self.export_bin_file)
+        self.ui.frameSelector.valueChanged.connect(self.setFrame)
+        self.ui.playbackRate.editingFinished.connect(self.updatePlaybackRate)
+        self.ui.realTimeCheckBox.stateChanged.connect(self.updatePlaybackRate)
+        self.ui.gotoTimeEdit.returnPressed.connect(self.goToTime)
+        self.ui.rawDisplayScale.valueChanged.connect(self.setRawScale)
+        self.ui.blackLevelSpinBox.editingFinished.connect(self.updateDisplayTransform)
+        self.ui.whiteLevelSpinBox.editingFinished.connect(self.updateDisplayTransform)
+        self.ui.gammaSpinBox.editingFinished.connect(self.updateDisplayTransform)
+        self.ui.whiteBalanceCheckBox.stateChanged.connect(self.updateDisplayTransform)
+        self.ui.followCheckBox.stateChanged.connect(self.toggleFollow)
+        self.ui.autoLevelsButton.clicked.connect(self.autoLevels)
+        self.ui.frameSelector.sliderMoved.connect(self.showThumbnailPreview)
+        self.ui.frameSelector.sliderReleased.connect(self.thumbnail_preview.hide)
+        self.ui.frameSelector.setMouseTracking(True)
+        self.ui.frameSelector.installEventFilter(self)
+
+        # menu
+        self.ui.actionOpen_File.triggered.connect(self.open_bin_file)
+        self.ui.actionOpen_Directory.triggered.connect(self.open_dirs)
+        self.ui.actionContact_Sheet.triggered.connect(self.showContactSheet)
+
+        self.ui.fileListComboBox.currentIndexChanged.connect(self.get_bin_file_from_dir)
+
+    def open_dirs(self):
+
+        dir_path = QtGui.QFileDialog.getExistingDirectory(self, 'Select Bin Directory',
+                                                          'c:\\Users\\paul\\Downloads')
+
+        if dir_path:
+            self.bindir = dir_path
+            self.cancel_dir_scan()
+
+            self.all_bin_files = []
+            self.ui.fileListComboBox.clear()
+
+            # the list fills in as files are found, summaries are added once headers are read
+            self.dir_scanner = DirectoryScanner(self.bindir)
+            self.dir_scanner.fileFound.connect(self.addBinFile)
+            self.dir_scanner.fileSummary.connect(self.setBinFileSummary)
+            self.dir_scanner.scanDone.connect(self.addAllFilesItem)
+            self.dir_scanner.start()
+
+    def cancel_dir_scan(self):
+        if self.dir_scanner is not None:
+            self.dir_scanner.cancel()
+            self.dir_scanner.fileFound.disconnect(self.addBinFile)
+            self.dir_scanner.fileSummary.disconnect(self.setBinFileSummary)
+            self.dir_scanner.scanDone.disconnect(self.addAllFilesItem)
+            self.dir_scanner.wait()
+            self.dir_scanner = None
+
+    def addBinFile(self, bin_file):
+        self.all_bin_files.append(bin_file)
+        self.ui.fileListComboBox.addItem(os.path.basename(bin_file))
+
+    def addAllFilesItem(self, done=True):
+        # the last entry plays every file in the directory as one sequence
+        if done and len(self.all_bin_files) > 1:
+            self.ui.fileListComboBox.addItem('All files (continuous)')
+
+    def setBinFileSummary(self, bin_file, summary):
+        if bin_file not in self.all_bin_files:
+            return
+        index = self.all_bin_files.index(bin_file)
+        self.ui.fileListComboBox.setItemText(index, '%s  [%d frames, %dx%d, fmt %d, %s]' % (
+            os.path.basename(bin_file), summary['frames'], summary['width'], summary['height'],
+            summary['format'], format_time(summary['start_time'])))
+        self.ui.fileListComboBox.setItemData(index, '%s\n%s to %s UTC' % (
+            bin_file, format_time(summary['start_time']), format_time(summary['end_time'])),
+            QtCore.Qt.ToolTipRole)
+
+    def get_bin_file_from_dir(self, file_index):
+
+        if 0 <= file_index < len(self.all_bin_files):
+            file_path = self.all_bin_files[file_index]
+            self.load_bin_file(file_path)
+        elif file_index == len(self.all_bin_files) and file_index > 1:
+            self.load_bin_file(list(self.all_bin_files))
+
+    def open_bin_file(self):
+        file_path = QtGui.QFileDialog.getOpenFileName(self, 'Open Bin File',
+                                                      'c:\\Users\\paul\\Downloads', "Bin files (*.bin)")
+        if file_path:
+            self.cancel_dir_scan()
+            self.all_bin_files = []
+            self.ui.fileListComboBox.clear()
+            self.ui.fileListComboBox.addItem(os.path.basename(file_path[0]))
+            self.load_bin_file(file_path[0])
+
+    def export_bin_file(self):
+        if self.filepath is not None:
+            raw_image = self.raw_file_handler.raw_image
+            dialog = ExportOptionsDialog(self, raw_image.frames_in_file, raw_image.img_width, raw_image.img_height)
+            if not dialog.exec_():
+                return
+            try:
+                selection, export_options = dialog.options()
+            except ValueError as e:
+                self.ui.statusBar.showMessage('Export cancelled: ' + str(e), 5000)
+                return
+
+            source_path = raw_image.filepath
+            dir_path = QtGui.QFileDialog.getExistingDirectory(self, 'Select Export Directory',
+                                                              os.path.dirname(source_path))
+            if dir_path:
+                LOG.info('Exporting: ' + source_path)
+                raw_export = RawImageExporter(self.filepath, dir_path, selection, export_options)
+                if isinstance(self.filepath, list):
+                    self.exportpath = dir_path
+                else:
+                    self.exportpath = os.path.join(dir_path,os.path.basename(self.filepath)[:-4] + '.tiff')
+                raw_export.exportDone.connect(self.export_finished)
+                raw_export.start()
+
+    def export_finished(self, done=True, error=''):
+        if done and self.exportpath:
+            ret = QtGui.QMessageBox.information(self, 'Bin File Export', 'Exported bin file to: ' + self.exportpath)
+        elif not done:
+            QtGui.QMessageBox.warning(self, 'Bin File Export', 'Export failed: ' + error)
+
+    def load_bin_file(self, file_path):
+
+        print(file_path)
+
+        if file_path:
+            # a list of files is played as one continuous sequence
+            self.filepath = file_path
+            if isinstance(file_path, list):
+                LOG.info('Files selected: ' + str(len(file_path)) + ' bin files')
+            else:
+                LOG.info('File selected: ' + self.filepath)
+            self.stop_loaders()
+            self.raw_file_handler = RawImageLoader(self.filepath)
+            self.raw_file_handler.frameReady.connect(self.showReadyFrame)
+            self.raw_file_handler.tileReady.connect(self.showTile)
+            self.raw_file_handler.start()
+
+            if self.rawImageWidget is None:
+                self.rawDataDisplay = ImageDisplay(pg.ViewBox(), self.ui.rawImageView)
+                self.rawDataDisplay.line_tool.sigRegionChanged.connect(self.updateLine)
+                self.rawDataDisplay.view_box.sigRangeChanged.connect(self.scheduleTileUpdate)
+            else:
+                self.rawDataDisplay = RawImageDisplay(self.rawImageWidget)
+            self.tile_frame = None
+
+            last_frame = max(self.raw_file_handler.raw_image.frames_in_file - 1, 0)
+            self.ui.frameSelector.setMaximum(last_frame)
+            self.ui.frameNumberSpinBox.setMaximum(last_frame)
+            self.frame_index = 0
+            self.ui.frameNumberSpinBox.setValue(0)
+            self.image_header = None
+            self.image = None
+
+            # update file header info
+            self.ui.fileInfo.clear()
+            self.ui.fileInfo.insertPlainText(
+                json.dumps(self.raw_file_handler.raw_image.file_header, indent=4)
+            )
+
+            if self.raw_file_handler.raw_image.frames_in_file == 0:
+                # a file the camera has only just created, follow it until the first frame is written
+                self.ui.statusBar.showMessage('No frames in the file yet, following it for new frames', 5000)
+                self.frame_stats = None
+                self.thumbnails = None
+                self.ui.statsPlot.clear()
+                self.ui.followCheckBox.setChecked(True)
+                return
+
+            self.showFirstFrame()
+
+    def stop_loaders(self):
+        # the stats and thumbnail loaders read through the file of the frame loader, stop them first
+        if self.stats_loader is not None:
+            self.stats_loader.cancel()
+            self.stats_loader.statsReady.disconnect(self.showFrameStats)
+            self.stats_loader.wait()
+            self.stats_loader = None
+        if self.thumbnail_loader is not None:
+            self.thumbnail_loader.cancel()
+            self.thumbnail_loader.thumbnailsReady.disconnect(self.setThumbnails)
+            self.thumbnail_loader.wait()
+            self.thumbnail_loader = None
+        if self.raw_file_handler is not None:
+            self.raw_file_handler.stop()
+            self.raw_file_handler = None
+
+    def showFirstFrame(self):
+        # block for the first frame only, it is needed to set the display scale
+        frame = self.raw_file_handler.get_frame(0)
+        if frame is not None:
+            (self.image_header, self.image) = frame
+        else:
+            self.ui.statusBar.showMessage('Could not decode frame 0', 5000)
+
+        # the display transform already maps the levels to the 8-bit display image
+        self.ui.rawDisplayScale.setValue(255)
+        if self.image is not None:
+            self.drawRawFrame()
+
+        # window covers the full bit depth of the file until the frame statistics are ready
+        self.ui.blackLevelSpinBox.setValue(0)
+        self.ui.whiteLevelSpinBox.setValue(2**(8*self.raw_file_handler.raw_image.file_header['pixel_format']) - 1)
+        self.updateDisplayTransform()
+
+        self.frame_stats = None
+        self.ui.statsPlot.clear()
+        self.stats_loader = FrameStatsLoader(self.raw_file_handler.raw_image)
+        self.stats_loader.statsReady.connect(self.showFrameStats)
+        self.stats_loader.start()
+
+        # the slider decodes every frame it passes over until thumbnails are ready
+        self.thumbnails = None
+        self.ui.frameSelector.setTracking(True)
+        self.thumbnail_loader = ThumbnailLoader(self.raw_file_handler.raw_image)
+        self.thumbnail_loader.thumbnailsReady.connect(self.setThumbnails)
+        self.thumbnail_loader.start()
+
+    def playback(self):
+        # show the frame that is due now, skipping any the display did not keep up with
+        index = self.playback_clock.target()
+        if index != self.frame_index:
+            self.playback_stats.request(index)
+            self.setFrameIndex(index)
+
+    def startPlayback(self):
+        raw_image = self.raw_file_handler.raw_image
+        times = None
+        if self.ui.realTimeCheckBox.isChecked():
+            times = raw_image.timestamps()
+            if len(times) < 2 or np.any(np.diff(times) < 0):
+                self.ui.statusBar.showMessage('Frame times are not in order, playing at a fixed rate', 5000)
+                times = None
+        self.playback_clock = PlaybackClock(raw_image.frames_in_file, self.playbackRateValue(), times)
+        self.playback_clock.start(self.frame_index)
+        self.playback_stats.reset()
+        self.playback_timer.start(self.playback_clock.tick_ms())
+
+    def restartPlaybackClock(self):
+        # playback continues from a frame the user went to
+        if self.playing and self.playback_clock is not None:
+            self.playback_clock.start(self.frame_index)
+            self.playback_stats.seek()
+
+    def setFrameIndex(self, index):
+        if self.raw_file_handler is None or self.raw_file_handler.raw_image.frames_in_file == 0:
+            return
+
+        direction = -1 if index < self.frame_index else 1
+        self.frame_index = index % self.raw_file_handler.raw_image.frames_in_file
+        if self.frame_index < 0:
+            self.frame_index = 0
+        # prefetch around the new frame, further ahead the faster we are playing
+        rate = self.playback_clock.frame_rate() if self.playing and self.playback_clock is not None else 0.0
+        self.raw_file_handler.seek(self.frame_index, direction, rate)
+        # keep spingbox up to date with window
+        self.ui.frameNumberSpinBox.setValue(self.frame_index)
+        # the frame is drawn from frameReady, right away if it is already decoded
+        self.raw_file_handler.request_frame(int(self.frame_index))
+
+    def toggleFollow(self):
+        if self.ui.followCheckBox.isChecked():
+            self.follow_timer.start(self.FOLLOW_INTERVAL_MS)
+            self.followFile()
+        else:
+            self.follow_timer.stop()
+
+    def followFile(self):
+        if self.raw_file_handler is None:
+            return
+        old_frames = self.raw_file_handler.raw_image.frames_in_file
+        if self.raw_file_handler.refresh() == 0:
+            return
+        # extend the slider and jump to the newest complete frame
+        last_frame = self.raw_file_handler.raw_image.frames_in_file - 1
+        self.ui.frameSelector.setMaximum(last_frame)
+        self.ui.frameNumberSpinBox.setMaximum(last_frame)
+        if old_frames == 0:
+            # the first frames of a file that was empty when it was opened
+            self.showFirstFrame()
+        self.ui.frameSelector.setValue(last_frame)
+
+    def showReadyFrame(self, index):
+        if index == self.frame_index and self.rawDataDisplay is not None:
+            frame = self.raw_file_handler.get_frame(index)
+            if frame is None:
+                self.ui.statusBar.showMessage('Could not decode frame ' + str(index), 5000)
+                return
+            (self.image_header, self.image) = frame
+            self.drawRawFrame()
+            if self.playing:
+                self.playback_stats.drawn(index)
+            # tiles of the previous frame no longer match, the new ones are decoded on request
+            self.rawDataDisplay.remove_tiles()
+            self.tile_frame = index
+            self.updateTiles()
+
+    def scheduleTileUpdate(self):
+        self.tile_timer.start(self.TILE_DELAY_MS)
+
+    def updateTiles(self):
+        if self.rawDataDisplay is None or self.raw_file_handler is None:
+            return
+        # zoomed in past the overview resolution, show the visible tiles of the finest level needed
+        pyramid = self.raw_file_handler.pyramid
+        region, sensor_pixels = self.rawDataDisplay.sensor_view((pyramid.height, pyramid.width))
+        level = pyramid.level_for(sensor_pixels) if region is not None else None
+        tiles = pyramid.visible_tiles(level, region) if level is not None else []
+        self.rawDataDisplay.remove_tiles(keep=tiles)
+        self.raw_file_handler.request_tiles(self.frame_index, tiles)
+
+    def showTile(self, index, tile):
+        if self.rawDataDisplay is None or index != self.frame_index:
+            return
+        if index == self.tile_frame and tile in self.rawDataDisplay.tiles:
+            return
+        key = (index,) + tuple(tile)
+        if key not in self.raw_file_handler.wanted_tiles:
+            return
+        image = self.raw_file_handler.tile_cache.get(key)
+        if image is not None:
+            pyramid = self.raw_file_handler.pyramid
+            self.rawDataDisplay.draw_tile(tile, image, pyramid.tile_region(tile), (pyramid.height, pyramid.width))
+
+    def showFrameStats(self, stats):
+        if self.raw_file_handler is None or stats.raw_image is not self.raw_file_handler.raw_image:
+            return
+        self.frame_stats = stats
+
+        # mean and bright end of every frame, with the Bayer channel means in their colors
+        self.ui.statsPlot.clear()
+        self.ui.statsPlot.addLegend()
+        self.ui.statsPlot.plot(stats.percentiles[:, -1], pen='y', name='99.9%')
+        self.ui.statsPlot.plot(stats.mean, pen='w', name='mean')
+        self.ui.statsPlot.plot(stats.channel_means[:, 3], pen='r', name='red')
+        self.ui.statsPlot.plot(stats.channel_means[:, 1:3].mean(axis=1), pen='g', name='green')
+        self.ui.statsPlot.plot(stats.channel_means[:, 0], pen='b', name='blue')
+
+        # drag the marker to go to a frame
+        self.stats_marker = pg.InfiniteLine(self.frame_index, angle=90, movable=True)
+        self.stats_marker.sigPositionChangeFinished.connect(self.statsMarkerMoved)
+        self.ui.statsPlot.addItem(self.stats_marker)
+
+        self.autoLevels()
+
+    def statsMarkerMoved(self):
+        self.ui.frameSelector.setValue(int(round(self.stats_marker.value())))
+
+    def autoLevels(self):
+        if self.frame_stats is None or len(self.frame_stats.mean) == 0:
+            return
+        black, white = self.frame_stats.levels()
+        self.ui.blackLevelSpinBox.setValue(black)
+        self.ui.whiteLevelSpinBox.setValue(white)
+        self.updateDisplayTransform()
+
+    def setThumbnails(self, thumbnails):
+        if self.raw_file_handler is None or thumbnails.raw_image is not self.raw_file_handler.raw_image:
+            return
+        self.thumbnails = thumbnails
+        # dragging shows thumbnails and only the frame where the slider is released is decoded
+        self.ui.frameSelector.setTracking(False)
+        self.ui.statusBar.showMessage('Thumbnails ready: ' + str(len(thumbnails.frames)) + ' frames', 5000)
+
+    def closeEvent(self, event):
+        # background threads hold the open files, stop them before the window goes away
+        self.playback_timer.stop()
+        self.follow_timer.stop()
+        self.cancel_dir_scan()
+        self.stop_loaders()
+        TemplateBaseClass.closeEvent(self, event)
+
+    def eventFilter(self, obj, event):
+        if obj is self.ui.frameSelector:
+            if event.type() == QtCore.QEvent.MouseMove and not self.ui.frameSelector.isSliderDown():
+                slider = self.ui.frameSelector
+                index = QtWidgets.QStyle.sliderValueFromPosition(slider.minimum(), slider.maximum(),
+                                                                 int(event.pos().x()), slider.width())
+                self.showThumbnailPreview(index)
+            elif event.type() == QtCore.QEvent.Leave:
+                self.thumbnail_preview.hide()
+        return TemplateBaseClass.eventFilter(self, obj, event)
+
+    def showThumbnailPreview(self, index):
+        if self.thumbnails is None:
+            return
+        page = self.thumbnails.nearest(index)
+        if page is None:
+            return
+        image = np.ascontiguousarray(self.thumbnails.images[page])
+        height, width = image.shape[:2]
+        qimage = QtGui.QImage(image.data, width, height, 3 * width, QtGui.QImage.Format_RGB888)
+        self.thumbnail_preview.setPixmap(QtGui.QPixmap.fromImage(qimage))
+        self.thumbnail_preview.resize(width, height)
+
+        # centered on the cursor just above the slider
+        slider = self.ui.frameSelector
+        x = QtWidgets.QStyle.sliderPositionFromValue(slider.minimum(), slider.maximum(), index, slider.width())
+        pos = slider.mapToGlobal(QtCore.QPoint(x - width // 2, -height - 4))
+        self.thumbnail_preview.move(pos)
+        self.thumbnail_preview.show()
+        self.ui.statusBar.showMessage('Frame ' + str(int(self.thumbnails.frames[page])), 1000)
+
+    def showContactSheet(self):
+        if self.thumbnails is None:
+            self.ui.statusBar.showMessage('Thumbnails are not ready yet', 5000)
+            return
+        self.contact_sheet = ContactSheet(self.thumbnails)
+        self.contact_sheet.frameClicked.connect(self.ui.frameSelector.setValue)
+        self.contact_sheet.show()
+
+    def goToTime(self):
+        if self.raw_file_handler is None:
+            return
+        try:
+            timestamp = parse_time(self.ui.gotoTimeEdit.text())
+        except ValueError:
+            self.ui.statusBar.showMessage('Could not parse time: ' + self.ui.gotoTimeEdit.text(), 5000)
+            return
+        index = self.raw_file_handler.raw_image.find_frame(timestamp)
+        if index is not None:
+            self.ui.statusBar.showMessage('Frame ' + str(index) + ' is closest to ' + format_time(timestamp) + ' UTC', 5000)
+            self.setFrameIndex(index)
+            self.restartPlaybackClock()
+
+    def playbackRateValue(self):
+        try:
+            return float(self.ui.playbackRate.text())
+        except ValueError:
+            return 30.0
+
+    def updatePlaybackRate(self):
+        if self.playing:
+            self.playback_timer.stop()
+            self.startPlayback()
+
+    def togglePlay(self):
+        if self.raw_file_handler is None or self.raw_file_handler.raw_image.frames_in_file == 0:
+            return
+        if self.playing:
+            self.playing = False
+            self.ui.playButton.setStyleSheet("")
+            self.playback_timer.stop()
+            self.updatePanels()
+        else:
+            self.playing = True
+            self.ui.playButton.setStyleSheet("background-color: #999;")
+            self.startPlayback()
+
+    def setScale(self):
+        self.rawImageDisplayScale = self.ui.rawDisplayScale.value()
+        self.drawRawFrame()
+
+    def setFrame(self):
+        index = self.ui.frameSelector.value()
+        if index != self.frame_index:
+            self.setFrameIndex(index)
+            self.restartPlaybackClock()
+
+    def prevFrame(self):
+        self.setFrameIndex(self.frame_index - 1)
+        self.restartPlaybackClock()
+
+    def nextFrame(self):
+        self.setFrameIndex(self.frame_index + 1)
+        self.restartPlaybackClock()
+
+    def updateLine(self):
+        line_data = self.rawDataDisplay.get_line(self.image)
+        if line_data is None:
+            return
+        for column, curve in enumerate(self.line_curves):
+            curve.setData(line_data[:, column])
+
+    def drawRawFrame(self):
+        self.rawDataDisplay.draw(self.image, self.ui.rawDisplayScale.value())
+        # side panels are refreshed at a lower rate during playback
+        if self.playing:
+            if not self.panel_timer.isActive():
+                self.panel_timer.start(self.PANEL_INTERVAL_MS)
+        else:
+            self.updatePanels()
+
+    def updatePanels(self):
+        if self.rawDataDisplay is None or self.image is None:
+            return
+        self.updateLine()
+        # update frame info
+        self.ui.frameInfo.setPlainText(json.dumps(self.image_header, indent=4, sort_keys=True))
+        if self.stats_marker is not None:
+            self.stats_marker.setValue(self.frame_index)
+        if self.playback_clock is not None:
+            self.playbackStatsLabel.setText(self.playback_stats.summary())
+
+    def updateDisplayTransform(self):
+        if self.raw_file_handler is None:
+            return
+        file_header = self.raw_file_handler.raw_image.file_header
+        white_balance = self.ui.whiteBalanceCheckBox.isChecked()
+        transform = DisplayTransform(
+            black=self.ui.blackLevelSpinBox.value(),
+            white=self.ui.whiteLevelSpinBox.value(),
+            gamma=self.ui.gammaSpinBox.value(),
+            red_gain=file_header['red_gain'] if white_balance else 1.0,
+            blue_gain=file_header['blue_gain'] if white_balance else 1.0
+        )
+        self.raw_file_handler.set_display_transform(transform)
+        # a followed file may not have a frame to redraw yet
+        if self.raw_file_handler.raw_image.frames_in_file > 0:
+            self.raw_file_handler.request_frame(int(self.frame_index))
+
+    def setRawScale(self, scale):
+        self.rawDataDisplay.set_levels(scale)
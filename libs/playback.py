@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+playback.py -- wall clock pacing of playback and display rate, latency and dropped frame counts
+Author Paul L. D. Roberts
+Copyright 2020  Scripps Institution of Oceanography
+Distributed under MIT license. See license.txt for more information.
+"""
+
+import time
+import numpy as np
+from collections import deque
+
+# fastest the playback timer is run, frames due in between are skipped
+MIN_TICK_MS = 5
+
+# display rate and latency are averaged over this many drawn frames
+STATS_WINDOW = 60
+
+
+class PlaybackClock:
+    """Frame that should be on screen at a wall clock time
+
+    With times, playback follows the acquisition timestamps of the frames, including any
+    gaps, so a file plays at the rate it was recorded whatever the timer does. Without
+    times, frames are shown at a fixed rate. Either way a slow tick or decode skips frames
+    instead of slowing playback down.
+    """
+
+    def __init__(self, frames, rate=30.0, times=None):
+
+        self.frames = frames
+        self.rate = rate
+        self.times = times
+        self.start_index = 0
+        self.start_time = 0.0
+        self.cached_frame_rate = None
+
+    def acquisition_rate(self):
+        """Median frame rate of the timestamps, None without timestamps"""
+
+        if self.times is None or len(self.times) < 2:
+            return None
+        intervals = np.diff(self.times)
+        intervals = intervals[intervals > 0]
+        if len(intervals) == 0:
+            return None
+        return 1.0 / float(np.median(intervals))
+
+    def frame_rate(self):
+        """Frames per second being played"""
+
+        if self.cached_frame_rate is None:
+            rate = self.acquisition_rate() if self.times is not None else self.rate
+            self.cached_frame_rate = rate if rate and rate > 0 else 30.0
+        return self.cached_frame_rate
+
+    def tick_ms(self):
+        """Playback timer interval in whole milliseconds"""
+
+        return max(int(round(1000.0 / self.frame_rate())), MIN_TICK_MS)
+
+    def start(self, index, now=None):
+
+        self.start_index = index
+        self.start_time = time.perf_counter() if now is None else now
+
+    def target(self, now=None):
+        """Frame due at now, playback restarts from the first frame after the last one"""
+
+        now = time.perf_counter() if now is None else now
+        elapsed = now - self.start_time
+        if self.times is not None:
+            due = self.times[self.start_index] + elapsed
+            index = int(np.searchsorted(self.times, due, side='right')) - 1
+        else:
+            index = self.start_index + int(elapsed * self.rate)
+
+        if index >= self.frames:
+            self.start(0, now)
+            return 0
+        return max(index, self.start_index)
+
+
+class PlaybackStats:
+    """Display rate, request to draw latency and dropped frames during playback
+
+    A frame is requested when it becomes due and drawn once it is decoded. Frames that are
+    skipped because they were due while another was on screen, and frames drawn too late
+    to still be the one requested, count as dropped.
+    """
+
+    def __init__(self):
+
+        self.reset()
+
+    def reset(self):
+
+        self.requested = {}
+        self.draw_times = deque(maxlen=STATS_WINDOW)
+        self.latencies = deque(maxlen=STATS_WINDOW)
+        self.dropped = 0
+        self.last_requested = None
+
+    def request(self, index, now=None):
+
+        now = time.perf_counter() if now is None else now
+        if self.last_requested is not None and index > self.last_requested + 1:
+            self.dropped += index - self.last_requested - 1
+        if self.requested and index not in self.requested:
+            # the frame still waiting to be drawn will never be shown
+            self.dropped += len(self.requested)
+            self.requested.clear()
+        self.requested[index] = now
+        self.last_requested = index
+
+    def seek(self):
+        # a jump made by the user is not a dropped frame
+        self.requested.clear()
+        self.last_requested = None
+
+    def drawn(self, index, now=None):
+
+        now = time.perf_counter() if now is None else now
+        requested = self.requested.pop(index, None)
+        if requested is None:
+            return
+        self.latencies.append(now - requested)
+        self.draw_times.append(now)
+
+    def fps(self):
+
+        if len(self.draw_times) < 2 or self.draw_times[-1] == self.draw_times[0]:
+            return 0.0
+        return (len(self.draw_times) - 1) / (self.draw_times[-1] - self.draw_times[0])
+
+    def latency_ms(self):
+
+        return 1000.0 * float(np.mean(self.latencies)) if self.latencies else 0.0
+
+    def summary(self):
+
+        return '%.1f fps  %.0f ms latency  %d dropped' % (self.fps(), self.latency_ms(), self.dropped)
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+prefetch.py -- plan which frames to decode next based on the current frame and playback
+Author Paul L. D. Roberts
+Copyright 2020  Scripps Institution of Oceanography
+Distributed under MIT license. See license.txt for more information.
+"""
+
+import threading
+from collections import deque
+
+
+class PrefetchScheduler:
+
+    def __init__(self, frame_count, ahead_seconds=2.0, behind_fraction=0.25, min_ahead=4):
+
+        self.frame_count = frame_count
+        self.ahead_seconds = ahead_seconds
+        self.behind_fraction = behind_fraction
+        self.min_ahead = min_ahead
+        self.queue = deque()
+        self.urgent = deque()
+        self.lock = threading.Lock()
+        self.work_available = threading.Condition(self.lock)
+        self.stopped = False
+
+    def set_frame_count(self, frame_count):
+        """Grow or shrink the sequence, for a file that is still being written"""
+
+        with self.lock:
+            self.frame_count = frame_count
+
+    def window(self, rate, capacity=None):
+        """Number of frames to decode ahead of and behind the current frame
+
+        The window ahead covers ahead_seconds of playback at rate frames/s, and both windows
+        together are limited to capacity frames so prefetching never evicts frames that are
+        about to be shown.
+        """
+        ahead = max(int(rate * self.ahead_seconds), self.min_ahead)
+        behind = max(int(ahead * self.behind_fraction), 1)
+        if capacity is not None:
+            capacity = max(capacity - 1, 0)
+            ahead = min(ahead, capacity)
+            behind = min(behind, capacity - ahead)
+        return ahead, behind
+
+    def plan(self, index, direction=1, rate=0.0, capacity=None):
+        """Replace the queue with the current frame, then the window ahead in the playback
+        direction, then the smaller window behind. Indices wrap like playback does.
+
+        Parameters:
+        -----------
+        index : int
+            Frame that is being displayed
+        direction : {1, -1}
+            Playback or stepping direction
+        rate : float
+            Playback rate in frames/s, 0 when paused
+        capacity : int, optional
+            Number of frames that fit in the cache
+        """
+        if self.frame_count <= 0:
+            return
+
+        ahead, behind = self.window(rate, capacity)
+        direction = -1 if direction < 0 else 1
+
+        order = [index]
+        order += [index + direction * d for d in range(1, ahead + 1)]
+        order += [index - direction * d for d in range(1, behind + 1)]
+
+        seen = set()
+        queue = deque()
+        for i in order:
+            i = i % self.frame_count
+            if i not in seen:
+                seen.add(i)
+                queue.append(i)
+
+        with self.lock:
+            self.queue = queue
+            self.work_available.notify_all()
+
+    def request(self, index):
+        """Queue a frame that a caller is waiting for ahead of the planned frames"""
+
+        with self.lock:
+            if self.frame_count <= 0:
+                return
+            index = index % self.frame_count
+            if index not in self.urgent:
+                self.urgent.append(index)
+            self.work_available.notify_all()
+
+    def stop(self):
+        """Wake the decode thread and hand out no more frames"""
+
+        with self.lock:
+            self.stopped = True
+            self.work_available.notify_all()
+
+    def next(self):
+        """Pop the next frame to decode, or None when the plan is done or stopped"""
+
+        with self.lock:
+            if self.stopped:
+                return None
+            if self.urgent:
+                return self.urgent.popleft()
+            if self.queue:
+                return self.queue.popleft()
+            return None
+
+    def wait(self, timeout=None):
+        """Block until there is a frame to decode, the scheduler is stopped or the timeout expires"""
+
+        with self.lock:
+            return self.work_available.wait_for(lambda: self.stopped or self.urgent or self.queue, timeout)
@@ -8,71 +8,173 @@ Distributed under MIT license. See license.txt for more information.
 
 import os
 import json
+import time
+import zlib
 import struct
+import threading
 import datetime
 import numpy as np
-import pyqtgraph as pg
-from tifffile import TiffWriter
-from psutil import virtual_memory
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from libs.logger import LOG
+from libs.sidecar import load_sidecar, save_sidecar
+from libs.tiff_tools import encode_frame, bin_bayer, truncate_tiff
+
+# bump when the layout of the sidecar index changes so old files get rebuilt
+INDEX_VERSION = 2
+
+# seconds between commits of export progress, an interrupted export resumes from the last one
+EXPORT_COMMIT_SECONDS = 2.0
+
+# binary layouts of the file header and the frame headers of format 1 and 2 files
+FILE_HEADER_FORMAT = 'HHiHHffffffHHBBHHHiiii'
+FILE_HEADER_PARAMS = [
+    'length',
+    'format',
+    'camera_id',
+    'pixel_format',
+    'illumination_type',
+    'flash_duration',
+    'flash_delay',
+    'exposure_time',
+    'gain',
+    'red_gain',
+    'blue_gain',
+    'vert_offset',
+    'horz_offset',
+    'vert_binning',
+    'horz_binning',
+    'binning_mode',
+    'raw_image_height',
+    'raw_image_width',
+    'unused1',
+    'unused2',
+    'unused3',
+    'unused4'
+]
+
+FRAME_HEADER_FORMAT = 'QQQIII'
+FRAME_HEADER_PARAMS = [
+    'unixtime',
+    'system_micros',
+    'camera_micros,',
+    'frame_number',
+    'width',
+    'height'
+]
+
+FRAME_HEADER_FORMAT_FMT2 = 'QQQIIIII'
+FRAME_HEADER_PARAMS_FMT2 = [
+    'unixtime',
+    'system_micros',
+    'camera_micros,',
+    'frame_number',
+    'width',
+    'height',
+    'position',
+    'flashtype'
+]
+
+
+class FrameSequence:
+    """Time lookups shared by readers of a frame sequence
+
+    Subclasses provide frames_in_file, frame_table() with a system_micros column and a
+    cached_time_index attribute.
+    """
+
+    # a collection spans several bin files, so nothing is cached next to it
+    is_collection = False
+
+    @property
+    def ram_available(self):
+        # psutil is only needed to size the GUI caches, so import it on first use
+        from psutil import virtual_memory
+        return virtual_memory().available
+
+    def timestamps(self):
+        """Time of every frame in unix seconds, from the system_micros column of the frame table"""
+
+        return self.frame_table()['system_micros'] / 1e6
+
+    def time_index(self):
+        """Sorted frame times and the frame index of each, built once from the frame table"""
+
+        if self.cached_time_index is None:
+            times = self.timestamps()
+            if np.all(np.diff(times) >= 0):
+                order = np.arange(len(times))
+            else:
+                order = np.argsort(times, kind='stable')
+            self.cached_time_index = (times[order], order)
+        return self.cached_time_index
+
+    def find_frame(self, timestamp):
+        """Binary search for the frame closest in time to timestamp
+
+        Parameters:
+        -----------
+        timestamp : float
+            Unix time in seconds
+
+        Returns:
+        --------
+        index : int
+            Index of the closest frame, or None if the file has no frames
+        """
+        times, order = self.time_index()
+        if len(times) == 0:
+            return None
+
+        i = int(np.searchsorted(times, timestamp))
+        if i >= len(times) or (i > 0 and timestamp - times[i - 1] <= times[i] - timestamp):
+            i -= 1
+        return int(order[i])
+
+    def select_frames(self, start=None, stop=None, start_time=None, end_time=None, step=None):
+        """Indices of the frames in a frame range and/or a time window, from headers only
+
+        Parameters:
+        -----------
+        start, stop, step : int, optional
+            Frame index range and stride, python slice semantics
+        start_time, end_time : float, optional
+            Unix times in seconds, frames with start_time <= t <= end_time are kept
+
+        Returns:
+        --------
+        frames : np.ndarray
+            Selected frame indices in file order
+        """
+        frames = np.arange(self.frames_in_file)[slice(start, stop, step)]
+        if start_time is not None or end_time is not None:
+            times = self.timestamps()[frames]
+            keep = np.ones(len(frames), dtype=bool)
+            if start_time is not None:
+                keep &= times >= start_time
+            if end_time is not None:
+                keep &= times <= end_time
+            frames = frames[keep]
+        return frames
+
+
+class RawImage(FrameSequence):
+
+    def __init__(self, filepath, use_mmap=False, use_index=False):
 
+        self.filepath = filepath
+        self.use_mmap = use_mmap
+        self.use_index = use_index
+        self.index_path = self.filepath + '.idx'
 
-class RawImage:
-
-    def __init__(self, filepath):
+        self.file_header_format = FILE_HEADER_FORMAT
+        self.file_header_params = FILE_HEADER_PARAMS
 
-        self.filepath = filepath
+        self.frame_header_format = FRAME_HEADER_FORMAT
+        self.frame_header_params = FRAME_HEADER_PARAMS
 
-        self.file_header_format = 'HHiHHffffffHHBBHHHiiii'
-        self.file_header_params = [
-            'length',
-            'format',
-            'camera_id',
-            'pixel_format',
-            'illumination_type',
-            'flash_duration',
-            'flash_delay',
-            'exposure_time',
-            'gain',
-            'red_gain',
-            'blue_gain',
-            'vert_offset',
-            'horz_offset',
-            'vert_binning',
-            'horz_binning',
-            'binning_mode',
-            'raw_image_height',
-            'raw_image_width',
-            'unused1',
-            'unused2',
-            'unused3',
-            'unused4'
-        ]
-
-        self.frame_header_format = 'QQQIII'
-        self.frame_header_params = [
-            'unixtime',
-            'system_micros',
-            'camera_micros,',
-            'frame_number',
-            'width',
-            'height'
-        ]
-
-        self.frame_header_format_fmt2 = 'QQQIIIII'
-        self.frame_header_params_fmt2 = [
-            'unixtime',
-            'system_micros',
-            'camera_micros,',
-            'frame_number',
-            'width',
-            'height',
-            'position',
-            'flashtype'
-        ]
-
-
-        self.can_to_ram = False
+        self.frame_header_format_fmt2 = FRAME_HEADER_FORMAT_FMT2
+        self.frame_header_params_fmt2 = FRAME_HEADER_PARAMS_FMT2
 
         self.file_fmt = 1
         self.file_header_length = 0
@@ -81,6 +183,16 @@ class RawImage:
         self.file_header = None
         self.frame_headers = []
         self.frame_data = []
+        self.read_lock = threading.Lock()
+
+        # per-frame header table, filled from the sidecar index when available
+        self.cached_frame_table = None
+        self.cached_time_index = None
+
+        # memory mapped view of all frames, only set when use_mmap is True
+        self.frames = None
+        self.frame_header_view = None
+        self.pixel_view = None
 
         # actual image width and height with raw size and binning
         self.img_width = 0
@@ -95,16 +207,26 @@ class RawImage:
             LOG.error(e)
             self.file_valid = False
 
-        # read the file header and set image sizes accordingly
-        self.read_file_header()
-
-        # check if we can load all frames into RAM
-        self.ram_available = virtual_memory().available
+        # read the file header and set image sizes accordingly, the sidecar index
+        # already holds a parsed copy if it is current
+        if not (self.use_index and self.load_index()):
+            self.read_file_header()
 
         # Get the number of frames in the file
         self.frames_in_file = int((self.file_size - self.file_header_length) / self.frame_size_in_bytes())
         LOG.info('Found ' + str(self.frames_in_file) + ' frames in ' + self.filepath)
 
+        if self.use_mmap:
+            self.map_frames()
+
+        if self.use_index and self.cached_frame_table is None:
+            self.build_index()
+
+    @property
+    def can_to_ram(self):
+        # check if we can load all frames into RAM
+        return self.frames_in_file * self.frame_size_in_bytes() < self.ram_available
+
     def unpack(self, format_string, names, raw_data):
 
         data = struct.unpack(format_string, raw_data)
@@ -115,36 +237,288 @@ class RawImage:
 
         return output
 
-    def export_as_tiff(self, output_path=None):
-        file_info = {}
-        file_info['file_header'] = self.file_header
-        file_info['frame_headers'] = []
+    def export_paths(self, output_path=None):
 
         if output_path is None:
-            tiff_path = self.filepath[:-4] + '.tiff'
-            json_path = self.filepath[:-4] + '.json'
+            base_path = self.filepath[:-4]
         else:
-            tiff_path = os.path.join(output_path, os.path.basename(self.filepath)[:-4]) + '.tiff'
-            json_path = os.path.join(output_path, os.path.basename(self.filepath)[:-4]) + '.json'
-
-        with TiffWriter(tiff_path, append=True) as tif:
-
-            for i in range(0, self.frames_in_file):
-                header, data = self.read_frame(i)
-                timestamp = float(header['system_micros']) / 1000000
-                dt = datetime.datetime.fromtimestamp(int(timestamp))
-                file_info['frame_headers'].append(header)
-                frame_header_string = json.dumps(header)
-                xtag = (65000, 's', 0, frame_header_string, False)
-                tif.save(
-                    data,
-                    description=json.dumps(file_info),
-                    datetime=dt,
-                    extratags=[xtag]
-                )
-
-        with open(json_path, "w") as f:
-            json.dump(file_info, f, indent=4, sort_keys=True)
+            base_path = os.path.join(output_path, os.path.basename(self.filepath)[:-4])
+
+        return base_path + '.tiff', base_path + '.json'
+
+    def export_as_tiff(self, output_path=None, compression=None, tile=None, workers=None, frames=None,
+                       roi=None, binning=1, resume=False):
+        """Stream all frames to a multipage tiff and the headers to a json sidecar
+
+        The full frame header table is written once, in the description of the first page,
+        and each page only carries its own frame header in tag 65000, so the time and size
+        of the export grow linearly with the number of frames. BigTIFF is used when the
+        pixel data would not fit in a classic tiff.
+
+        Pages are written to <name>.tiff.partial and <name>.json.partial, which are renamed
+        into place once the last frame is written, so a tiff is never seen half written.
+        The number of pages safely on disk is committed to <name>.tiff.progress every
+        EXPORT_COMMIT_SECONDS.
+
+        Parameters:
+        -----------
+        output_path : str, optional
+            Directory to write to instead of next to the bin file
+        compression : {None, 'none', 'zlib', 'deflate', 'lzw'}
+            Lossless compression, applied with the horizontal differencing predictor
+        tile : tuple of int, optional
+            Tile height and width (multiples of 16), frames are written as strips if None
+        workers : int, optional
+            Number of threads compressing frames, defaults to the number of CPUs
+        frames : sequence of int, optional
+            Indices of the frames to export in order, see select_frames, all frames if None
+        roi : tuple of int, optional
+            Pixel region (x, y, width, height) to export, aligned with subset_region
+        binning : int
+            Average binning x binning blocks of each Bayer plane, the output stays a Bayer mosaic
+        resume : bool
+            Continue an interrupted export of the same frames with the same options after its
+            last committed page instead of starting over
+
+        Returns:
+        --------
+        resumed : int
+            Number of frames already written by an earlier, interrupted export
+        """
+        from tifffile import TiffWriter
+
+        tiff_path, json_path = self.export_paths(output_path)
+        tiff_partial = tiff_path + '.partial'
+        json_partial = json_path + '.partial'
+
+        if compression == 'none':
+            compression = None
+        if workers is None or workers < 1:
+            workers = os.cpu_count() or 1
+
+        if frames is None:
+            frames = np.arange(self.frames_in_file)
+        frames = np.asarray(frames, dtype='int64')
+        if len(frames) == 0:
+            # a tiff without pages is not a valid tiff
+            raise ValueError('No frames selected in ' + self.filepath)
+
+        frame_headers = [self.frame_header_dict(row) for row in self.frame_table()[frames].tolist()]
+        file_info = {
+            'file_header': self.file_header,
+            'frame_headers': frame_headers
+        }
+
+        region = None
+        if roi is not None or binning != 1:
+            region = self.subset_region(roi, binning)
+            file_info['subset'] = {'roi': list(region), 'binning': binning}
+
+        # an interrupted export is only continued if it was writing exactly the same pages
+        file_size, mtime_ns = self.index_key()
+        job = {
+            'source_size': file_size,
+            'source_mtime_ns': mtime_ns,
+            'frames': len(frames),
+            'frames_crc': zlib.crc32(frames.tobytes()),
+            'compression': compression,
+            'tile': list(tile) if tile is not None else None,
+            'region': list(region) if region is not None else None,
+            'binning': binning
+        }
+
+        done = 0
+        progress = self.export_progress(output_path) if resume else None
+        if progress is not None and progress['job'] == job and os.path.exists(tiff_partial) and progress['frames_done'] > 0:
+            done = progress['frames_done']
+            truncate_tiff(tiff_partial, progress['tiff_bytes'], done)
+            LOG.info('Resuming export of ' + self.filepath + ' at frame ' + str(done) + ' of ' + str(len(frames)))
+        elif os.path.exists(tiff_partial):
+            os.remove(tiff_partial)
+
+        # leave room for the IFDs and metadata below the 4 GB classic tiff limit
+        bigtiff = len(frames) * self.export_frame_bytes(roi, binning) > 2**32 - 2**25
+
+        with TiffWriter(tiff_partial, append=done > 0, bigtiff=bigtiff) as tif, open(json_partial, 'w') as f:
+
+            f.write('{\n    "file_header": ' + json.dumps(self.file_header, sort_keys=True) + ',\n')
+            if region is not None:
+                f.write('    "subset": ' + json.dumps(file_info['subset'], sort_keys=True) + ',\n')
+            f.write('    "frame_headers": [')
+
+            # headers of the pages already in the tiff come from the frame table
+            for page in range(done):
+                f.write((',' if page > 0 else '') + '\n        ' + json.dumps(frame_headers[page], sort_keys=True))
+
+            last_commit = time.time()
+            for page, header, data, segments in self.export_pages(frames, done, region, binning,
+                                                                  compression, tile, workers):
+                self.write_tiff_page(tif, f, page, header, data, segments, file_info, compression, tile)
+                if time.time() - last_commit > EXPORT_COMMIT_SECONDS:
+                    tif.filehandle.flush()
+                    self.commit_export_progress(output_path, job, page + 1, tif.filehandle.tell())
+                    last_commit = time.time()
+
+            f.write('\n    ]\n}\n')
+
+        os.replace(tiff_partial, tiff_path)
+        os.replace(json_partial, json_path)
+        if os.path.exists(tiff_path + '.progress'):
+            os.remove(tiff_path + '.progress')
+
+        return done
+
+    def export_pages(self, frames, start, region, binning, compression, tile, workers):
+        """Pages to export from page start on, in order, as (page, header, data, segments)
+
+        Without compression segments is None. Otherwise it is a future of the encoded strips
+        or tiles, frames are compressed on a thread pool while the caller writes earlier pages.
+        """
+        if compression is None:
+            for page in range(start, len(frames)):
+                header, data = self.read_subset(int(frames[page]), region, binning)
+                yield page, header, data, None
+            return
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for page in range(start, len(frames)):
+                header, data = self.read_subset(int(frames[page]), region, binning)
+                pending.append((page, header, data, pool.submit(encode_frame, data, compression, True, tile)))
+                if len(pending) > 2 * workers:
+                    yield pending.popleft()
+            while pending:
+                yield pending.popleft()
+
+    def export_progress(self, output_path=None):
+        """Progress record of an interrupted export to output_path, or None if there is none
+
+        Returns:
+        --------
+        progress : dict
+            job (the source file and export options), frames_done and tiff_bytes, the size of
+            the partial tiff after the last committed page
+        """
+        progress_path = self.export_paths(output_path)[0] + '.progress'
+        try:
+            with open(progress_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def commit_export_progress(self, output_path, job, frames_done, tiff_bytes):
+
+        progress_path = self.export_paths(output_path)[0] + '.progress'
+        tmp_path = progress_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'job': job, 'frames_done': frames_done, 'tiff_bytes': tiff_bytes}, f)
+        os.replace(tmp_path, progress_path)
+
+    def subset_region(self, roi=None, binning=1):
+        """Clip and align a pixel region so it covers whole 2x2 Bayer cells and binning blocks
+
+        Parameters:
+        -----------
+        roi : tuple of int, optional
+            Requested region (x, y, width, height), the full frame if None
+        binning : int
+            Binning factor the region width and height must be divisible by, per Bayer plane
+
+        Returns:
+        --------
+        region : tuple of int
+            (x, y, width, height) with an even origin and sizes that are multiples of 2 * binning
+        """
+        if binning < 1:
+            raise ValueError('Binning must be a positive integer, got ' + str(binning))
+
+        x, y, width, height = roi if roi is not None else (0, 0, self.img_width, self.img_height)
+        x0 = max(int(x), 0) // 2 * 2
+        y0 = max(int(y), 0) // 2 * 2
+        block = 2 * binning
+        width = (min(int(x) + int(width), self.img_width) - x0) // block * block
+        height = (min(int(y) + int(height), self.img_height) - y0) // block * block
+
+        if width <= 0 or height <= 0:
+            raise ValueError('Region ' + str(roi) + ' is empty in a ' + str(self.img_width) + 'x' +
+                             str(self.img_height) + ' frame with binning ' + str(binning))
+        return x0, y0, width, height
+
+    def read_region(self, index, region):
+        """Read the header and a pixel region of one frame, only the rows of the region are read
+
+        Parameters:
+        -----------
+        index : int
+            Frame index
+        region : tuple of int
+            (x, y, width, height), see subset_region
+        """
+        x, y, width, height = region
+
+        if self.pixel_view is not None:
+            # slicing the map only pages in the rows that are used
+            return self.read_frame_header(index), self.pixel_view[index][y:y + height, x:x + width]
+
+        header = self.read_frame_header(index)
+        if header is None:
+            return None
+
+        if self.file_fmt == 1:
+            header_size = self.frame_header_size
+        else:
+            header_size = self.frame_header_size_fmt2
+        row_offset = (self.file_header_length + index * self.frame_size_in_bytes() + header_size +
+                      y * self.img_width * self.pixel_dtype().itemsize)
+
+        with self.read_lock:
+            self.file_handle.seek(row_offset, 0)
+            rows = np.fromfile(self.file_handle, dtype=self.pixel_dtype(), count=height * self.img_width)
+
+        return header, rows.reshape(height, self.img_width)[:, x:x + width]
+
+    def read_subset(self, index, region=None, binning=1):
+        """Frame header and pixels of one frame cropped to region and binned, see export_as_tiff
+
+        Raises ValueError if the frame can not be read, so an export stops with a clear error.
+        """
+        frame = self.read_frame(index) if region is None else self.read_region(index, region)
+        if frame is None:
+            raise ValueError('Could not read frame ' + str(index) + ' of ' + self.filepath)
+        if region is None:
+            return frame
+        header, data = frame
+        return header, bin_bayer(data, binning)
+
+    def write_tiff_page(self, tif, json_file, page, header, data, segments=None, file_info=None,
+                        compression=None, tile=None):
+
+        timestamp = float(header['system_micros']) / 1000000
+        dt = datetime.datetime.fromtimestamp(int(timestamp))
+        frame_header_string = json.dumps(header)
+        xtag = (65000, 's', 0, frame_header_string, False)
+        page_args = {
+            'description': json.dumps(file_info) if page == 0 else None,
+            'datetime': dt,
+            'extratags': [xtag],
+            'metadata': None,
+            'tile': tile
+        }
+
+        if segments is None:
+            tif.write(data, **page_args)
+        else:
+            tif.write(
+                iter(segments.result()),
+                shape=data.shape,
+                dtype=data.dtype,
+                compression=compression,
+                predictor=True,
+                rowsperstrip=None if tile is not None else data.shape[0],
+                **page_args
+            )
+
+        json_file.write((',' if page > 0 else '') + '\n        ' + json.dumps(header, sort_keys=True))
 
     def read_file_header(self):
 
@@ -157,12 +531,16 @@ class RawImage:
             # read the rest of the header
             self.file_handle.seek(0)
             res = self.file_handle.read(self.file_header_length)
-            self.file_header = self.unpack(self.file_header_format, self.file_header_params, res)
+            self.set_file_header(self.unpack(self.file_header_format, self.file_header_params, res))
+
+    def set_file_header(self, file_header):
 
-            self.file_fmt = self.file_header['format']
+        self.file_header = file_header
+        self.file_header_length = self.file_header['length']
+        self.file_fmt = self.file_header['format']
 
-            self.img_height = int(self.file_header['raw_image_height'] / self.file_header['vert_binning'])
-            self.img_width = int(self.file_header['raw_image_width'] / self.file_header['horz_binning'])
+        self.img_height = int(self.file_header['raw_image_height'] / self.file_header['vert_binning'])
+        self.img_width = int(self.file_header['raw_image_width'] / self.file_header['horz_binning'])
 
     def frame_size_in_bytes(self):
 
@@ -177,36 +555,361 @@ class RawImage:
 
         return self.img_width*self.img_height
 
+    def export_frame_bytes(self, roi=None, binning=1):
+        """Bytes of pixel data export_as_tiff writes per frame with roi and binning"""
+
+        if roi is not None or binning != 1:
+            region = self.subset_region(roi, binning)
+            pixels = region[2] * region[3] // (binning * binning)
+        else:
+            pixels = self.frame_pixels()
+        return pixels * self.pixel_dtype().itemsize
+
+    def pixel_dtype(self):
+
+        if self.file_header['pixel_format'] == 1:
+            return np.dtype('<u1')
+        else:
+            return np.dtype('<u2')
+
+    def header_field_names(self):
+
+        # struct format chars to field names without the legacy trailing comma
+        if self.file_fmt == 1:
+            return [p.rstrip(',') for p in self.frame_header_params]
+        else:
+            return [p.rstrip(',') for p in self.frame_header_params_fmt2]
+
+    def frame_header_dtype(self, itemsize=None):
+        """Structured dtype for the frame header fields
+
+        Parameters:
+        -----------
+        itemsize : int, optional
+            Stride of each record, set to the frame size to skip over pixel data
+
+        Returns:
+        --------
+        dtype : np.dtype
+            Header fields at the offsets of the native struct layout
+        """
+        if self.file_fmt == 1:
+            header_format = self.frame_header_format
+        else:
+            header_format = self.frame_header_format_fmt2
+
+        names = self.header_field_names()
+        formats = []
+        offsets = []
+        offset = 0
+        for c in header_format:
+            field_size = struct.calcsize(c)
+            formats.append('<u' + str(field_size))
+            offsets.append(offset)
+            offset += field_size
+
+        if itemsize is None:
+            itemsize = offset
+
+        return np.dtype({
+            'names': names,
+            'formats': formats,
+            'offsets': offsets,
+            'itemsize': itemsize
+        })
+
+    def frame_dtype(self):
+        """Structured dtype for one frame record: the frame header fields followed by the pixel block
+
+        Field offsets match the native struct layout used by read_frame so the dtype can be
+        laid directly over the file with np.memmap.
+        """
+        if self.file_fmt == 1:
+            header_size = self.frame_header_size
+        else:
+            header_size = self.frame_header_size_fmt2
+
+        header_dtype = self.frame_header_dtype()
+        names = list(header_dtype.names)
+        formats = [header_dtype.fields[n][0] for n in names]
+        offsets = [header_dtype.fields[n][1] for n in names]
+
+        names.append('pixels')
+        formats.append((self.pixel_dtype(), (self.img_height, self.img_width)))
+        offsets.append(header_size)
+
+        return np.dtype({
+            'names': names,
+            'formats': formats,
+            'offsets': offsets,
+            'itemsize': self.frame_size_in_bytes()
+        })
+
+    def map_frames(self, frames_in_file=None):
+        """Map all complete frames in the file as a read-only structured np.memmap
+
+        Parameters:
+        -----------
+        frames_in_file : int, optional
+            Number of frames to map, defaults to frames_in_file
+        """
+        if frames_in_file is None:
+            frames_in_file = self.frames_in_file
+
+        if not self.file_valid or frames_in_file <= 0:
+            return
+
+        frames = np.memmap(
+            self.filepath,
+            dtype=self.frame_dtype(),
+            mode='r',
+            offset=self.file_header_length,
+            shape=(frames_in_file,)
+        )
+        # views from an earlier map stay valid, so readers never see a closed map
+        self.frames = frames
+        self.frame_header_view = frames[self.header_field_names()]
+        self.pixel_view = frames['pixels']
+
+    def frame_table(self, start=0, stop=None):
+        """Decode the frame headers in the file in one strided pass
+
+        Only the header bytes of each frame are touched, pixel data is never read.
+
+        Parameters:
+        -----------
+        start, stop : int, optional
+            Range of frames to decode, all frames by default
+
+        Returns:
+        --------
+        table : np.ndarray
+            Structured array with one row per frame and a column per header field
+            (unixtime, system_micros, camera_micros, frame_number, width, height and for
+            format 2 files also position and flashtype)
+        """
+        header_dtype = self.frame_header_dtype()
+
+        if stop is None:
+            stop = self.frames_in_file
+        if not self.file_valid or stop <= start:
+            return np.zeros(0, dtype=header_dtype)
+
+        if self.cached_frame_table is not None:
+            return self.cached_frame_table[start:stop]
+
+        return self.scan_headers(start, stop)
+
+    def scan_headers(self, start, stop):
+        """Copy the headers of frames start to stop out of the file, see frame_table"""
+
+        header_dtype = self.frame_header_dtype()
+
+        if self.frame_header_view is not None and stop <= len(self.frame_header_view):
+            headers = self.frame_header_view[start:stop]
+        else:
+            headers = np.memmap(
+                self.filepath,
+                dtype=self.frame_header_dtype(itemsize=self.frame_size_in_bytes()),
+                mode='r',
+                offset=self.file_header_length + start * self.frame_size_in_bytes(),
+                shape=(stop - start,)
+            )
+
+        # copy out into a packed table so the map can be released
+        table = np.empty(stop - start, dtype=header_dtype)
+        table[:] = headers
+
+        return table
+
+    def index_key(self):
+
+        stat = os.stat(self.filepath)
+        return stat.st_size, stat.st_mtime_ns
+
+    def load_index(self):
+        """Load the parsed file header and frame table from the sidecar index
+
+        Returns:
+        --------
+        valid : bool
+            True if the index exists and matches the current size and mtime of the bin file
+        """
+        if not self.file_valid:
+            return False
+
+        index = load_sidecar(self.index_path, (INDEX_VERSION,) + self.index_key(), 'sidecar index')
+        if index is None:
+            return False
+        try:
+            file_header = json.loads(str(index['file_header']))
+            frame_table = index['frame_table']
+        except (ValueError, KeyError) as e:
+            LOG.warning('Could not read sidecar index ' + self.index_path + ': ' + str(e))
+            return False
+
+        self.set_file_header(file_header)
+        self.cached_frame_table = frame_table
+        return True
+
+    def build_index(self):
+        """Scan the frame headers and write them to the sidecar index next to the bin file"""
+
+        if not self.file_valid:
+            return
+
+        self.cached_frame_table = self.frame_table()
+        frame_offsets = self.file_header_length + np.arange(
+            self.frames_in_file, dtype='int64') * self.frame_size_in_bytes()
+        save_sidecar(
+            self.index_path,
+            (INDEX_VERSION,) + self.index_key(),
+            'sidecar index',
+            file_header=json.dumps(self.file_header),
+            frame_table=self.cached_frame_table,
+            frame_offsets=frame_offsets
+        )
+
+    def refresh(self):
+        """Pick up frames written to the file since it was opened or last refreshed
+
+        Used to follow a file the camera is still writing. Only complete frames are added,
+        a partially written frame at the end of the file is left for the next refresh. The
+        map is extended and only the headers of the new frames are read.
+
+        Returns:
+        --------
+        new_frames : int
+            Number of frames added
+        """
+        if not self.file_valid:
+            return 0
+
+        file_size = os.path.getsize(self.filepath)
+        frames_in_file = int((file_size - self.file_header_length) // self.frame_size_in_bytes())
+        if frames_in_file <= self.frames_in_file:
+            return 0
+
+        old_frames = self.frames_in_file
+        if self.use_mmap:
+            self.map_frames(frames_in_file)
+        if self.cached_frame_table is not None:
+            self.cached_frame_table = np.concatenate([
+                self.cached_frame_table,
+                self.scan_headers(old_frames, frames_in_file)
+            ])
+
+        # readers check the frame count, so it only grows once the new frames are mapped
+        self.file_size = file_size
+        self.frames_in_file = frames_in_file
+        self.cached_time_index = None
+        return frames_in_file - old_frames
+
+    def close(self):
+
+        self.frames = None
+        self.frame_header_view = None
+        self.pixel_view = None
+        if self.file_valid:
+            self.file_handle.close()
+
+    def frame_header_dict(self, values):
+
+        if self.file_fmt == 1:
+            return dict(zip(self.frame_header_params, values))
+        else:
+            return dict(zip(self.frame_header_params_fmt2, values))
+
+    def read_frame_header(self, index):
+        """Read only the header of one frame, without its pixels"""
+
+        if index < 0 or index >= self.frames_in_file:
+            LOG.error('Error reading frame header ' + str(index) + " from file " + self.filepath)
+            return None
+
+        if self.frame_header_view is not None:
+            return self.frame_header_dict(self.frame_header_view[index].tolist())
+
+        if self.file_fmt == 1:
+            header_format, header_size = self.frame_header_format, self.frame_header_size
+        else:
+            header_format, header_size = self.frame_header_format_fmt2, self.frame_header_size_fmt2
+
+        with self.read_lock:
+            self.file_handle.seek(self.file_header_length + index * self.frame_size_in_bytes(), 0)
+            raw_data = self.file_handle.read(header_size)
+        return self.frame_header_dict(struct.unpack(header_format, raw_data))
+
+    def summary(self):
+        """Short description of the file from the file header and the first and last frame headers
+
+        Returns:
+        --------
+        summary : dict
+            path, file_size, format, pixel_format, width, height, frames and the start_time,
+            end_time and duration in seconds from the frame system_micros
+        """
+        summary = {
+            'path': self.filepath,
+            'file_size': self.file_size,
+            'format': self.file_fmt,
+            'pixel_format': self.file_header['pixel_format'],
+            'width': self.img_width,
+            'height': self.img_height,
+            'frames': self.frames_in_file,
+            'start_time': None,
+            'end_time': None,
+            'duration': None
+        }
+        if self.frames_in_file > 0:
+            first = self.read_frame_header(0)
+            last = self.read_frame_header(self.frames_in_file - 1)
+            summary['start_time'] = first['system_micros'] / 1e6
+            summary['end_time'] = last['system_micros'] / 1e6
+            summary['duration'] = (last['system_micros'] - first['system_micros']) / 1e6
+        return summary
+
     def read_frame(self, index):
 
+        if self.frames is not None:
+            if index < 0 or index >= self.frames_in_file:
+                LOG.error('Error reading frame ' + str(index) + " from file " + self.filepath)
+                return None
+            # zero-copy: the image is a view into the page cache backed map
+            frame_header = self.frame_header_dict(self.frame_header_view[index].tolist())
+            return frame_header, self.pixel_view[index]
+
         frame_offset = self.file_header_length + index * self.frame_size_in_bytes()
         bpp = self.file_header['pixel_format']
         frame_pixels = self.frame_pixels()
 
         if self.file_valid:
 
-            # seek to the start of the frame
-            self.file_handle.seek(frame_offset, 0)
-
-            # read the header
-            if self.file_fmt == 1:
-                frame_header = self.unpack(
-                    self.frame_header_format,
-                    self.frame_header_params,
-                    self.file_handle.read(self.frame_header_size)
-                )
-            elif self.file_fmt == 2:
-                frame_header = self.unpack(
-                    self.frame_header_format_fmt2,
-                    self.frame_header_params_fmt2,
-                    self.file_handle.read(self.frame_header_size_fmt2)
-                )
-
-            # read the frame pixels
-            if bpp == 1:
-                res = np.fromfile(self.file_handle, dtype='uint8', count=frame_pixels)
-            else:
-                res = np.fromfile(self.file_handle, dtype='uint16', count=frame_pixels)
+            # the file handle is shared, so seek and read as one step when called from several threads
+            with self.read_lock:
+                # seek to the start of the frame
+                self.file_handle.seek(frame_offset, 0)
+
+                # read the header
+                if self.file_fmt == 1:
+                    frame_header = self.unpack(
+                        self.frame_header_format,
+                        self.frame_header_params,
+                        self.file_handle.read(self.frame_header_size)
+                    )
+                elif self.file_fmt == 2:
+                    frame_header = self.unpack(
+                        self.frame_header_format_fmt2,
+                        self.frame_header_params_fmt2,
+                        self.file_handle.read(self.frame_header_size_fmt2)
+                    )
+
+                # read the frame pixels
+                if bpp == 1:
+                    res = np.fromfile(self.file_handle, dtype='uint8', count=frame_pixels)
+                else:
+                    res = np.fromfile(self.file_handle, dtype='uint16', count=frame_pixels)
+
             if len(res) <= 0:
                 LOG.error('Error reading frame ' + str(index) + " from file " + self.filepath)
                 return None
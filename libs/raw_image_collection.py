@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+raw_image_collection.py -- many bin files from one deployment read as a single frame sequence
+Author Paul L. D. Roberts
+Copyright 2020  Scripps Institution of Oceanography
+Distributed under MIT license. See license.txt for more information.
+"""
+
+import os
+import threading
+import numpy as np
+from collections import OrderedDict
+from libs.raw_image import RawImage, FrameSequence, FRAME_HEADER_PARAMS_FMT2
+from libs.logger import LOG
+
+
+class RawImageCollection(FrameSequence):
+    """Time ordered frames of several bin files behind one global frame index
+
+    Only the frame headers of each file are read when the collection is built (from the
+    sidecar index when it is current). Pixel data is read on demand through a small LRU
+    pool of open, memory mapped files, so playing or seeking across file boundaries only
+    opens the files that are actually touched.
+
+    The collection has the read interface of RawImage that the loader and exporters use:
+    frames_in_file, file_header, frame_table, frame_header_dict, read_frame, find_frame,
+    select_frames, summary and export_as_tiff.
+    """
+
+    is_collection = True
+
+    def __init__(self, bin_files, max_open=4, use_mmap=True, use_index=True):
+
+        self.use_mmap = use_mmap
+        self.use_index = use_index
+        self.max_open = max(max_open, 1)
+
+        self.bin_files = []
+        self.file_sizes = []
+        self.file_header = None
+        self.file_fmt = 1
+        self.img_width = 0
+        self.img_height = 0
+        self.frame_bytes = 0
+
+        self.open_files = OrderedDict()
+        self.pool_lock = threading.Lock()
+        self.cached_time_index = None
+
+        files = []
+        for bin_file in bin_files:
+            try:
+                rw = RawImage(bin_file, use_index=self.use_index)
+            except Exception as e:
+                LOG.warning('Skipping unreadable bin file ' + bin_file + ': ' + repr(e))
+                continue
+            if rw.file_valid and rw.frames_in_file > 0:
+                table = rw.frame_table()
+                files.append((int(table['system_micros'][0]), bin_file, rw, table))
+            else:
+                LOG.warning('Skipping bin file without frames: ' + bin_file)
+            rw.close()
+
+        # files are joined in the order they were recorded, not the order they were listed
+        files.sort(key=lambda f: f[0])
+
+        if files:
+            first = files[0][2]
+            self.file_header = first.file_header
+            self.file_fmt = first.file_fmt
+            self.img_width = first.img_width
+            self.img_height = first.img_height
+            self.frame_bytes = first.frame_size_in_bytes()
+
+        # frames are decoded with the geometry of the first file, so files that differ are left out
+        tables = []
+        for _, bin_file, rw, table in files:
+            if (rw.img_width, rw.img_height, rw.file_header['pixel_format']) != \
+                    (self.img_width, self.img_height, self.file_header['pixel_format']):
+                LOG.warning('Skipping ' + bin_file + ', its frame size or pixel format differs from ' +
+                            self.bin_files[0])
+                continue
+            self.bin_files.append(bin_file)
+            self.file_sizes.append(rw.file_size)
+            tables.append(table)
+
+        frame_counts = [len(table) for table in tables]
+        self.file_offsets = np.concatenate([[0], np.cumsum(frame_counts)]).astype('int64')
+        self.frames_in_file = int(self.file_offsets[-1])
+        self.file_size = sum(self.file_sizes)
+        self.filepath = os.path.commonpath(self.bin_files) if self.bin_files else ''
+
+        # keep the header fields every file has so format 1 and 2 files can be mixed
+        names = [n for n in tables[0].dtype.names if all(n in t.dtype.names for t in tables)] if tables else []
+        self.frame_header_params = [p for p in FRAME_HEADER_PARAMS_FMT2 if p.rstrip(',') in names]
+        self.cached_frame_table = np.empty(self.frames_in_file, dtype=[(n, tables[0].dtype[n]) for n in names])
+        for table, start in zip(tables, self.file_offsets):
+            for n in names:
+                self.cached_frame_table[n][start:start + len(table)] = table[n]
+
+        LOG.info('Found ' + str(self.frames_in_file) + ' frames in ' + str(len(self.bin_files)) +
+                 ' bin files in ' + self.filepath)
+
+    @property
+    def file_valid(self):
+        return self.frames_in_file > 0
+
+    def frame_size_in_bytes(self):
+        return self.frame_bytes
+
+    def frame_table(self, start=0, stop=None):
+        """Frame headers of frames start to stop in time order, with the fields common to all files"""
+        return self.cached_frame_table[start:stop]
+
+    def frame_header_dict(self, values):
+        return dict(zip(self.frame_header_params, values))
+
+    def locate(self, index):
+        """File index and frame index within that file of a global frame index"""
+
+        file_index = int(np.searchsorted(self.file_offsets, index, side='right')) - 1
+        return file_index, int(index - self.file_offsets[file_index])
+
+    def file_for_frame(self, index):
+        return self.bin_files[self.locate(index)[0]]
+
+    def open_file(self, file_index):
+        """Open file from the pool, closing the least recently used one when it is full
+
+        Must be called with pool_lock held.
+        """
+        bin_file = self.bin_files[file_index]
+        rw = self.open_files.get(bin_file)
+        if rw is not None:
+            self.open_files.move_to_end(bin_file)
+            return rw
+
+        while len(self.open_files) >= self.max_open:
+            _, old = self.open_files.popitem(last=False)
+            old.close()
+
+        rw = RawImage(bin_file, use_mmap=self.use_mmap, use_index=self.use_index)
+        self.open_files[bin_file] = rw
+        return rw
+
+    def read_frame(self, index):
+
+        if index < 0 or index >= self.frames_in_file:
+            LOG.error('Error reading frame ' + str(index) + ' from collection ' + self.filepath)
+            return None
+
+        file_index, local_index = self.locate(index)
+
+        # a file must not be closed by another reader between opening and reading it,
+        # mapped frames are views and stay valid after the file leaves the pool
+        with self.pool_lock:
+            return self.open_file(file_index).read_frame(local_index)
+
+    def read_region(self, index, region):
+        """Header and a pixel region of one frame, see RawImage.read_region"""
+
+        if index < 0 or index >= self.frames_in_file:
+            LOG.error('Error reading frame ' + str(index) + ' from collection ' + self.filepath)
+            return None
+
+        file_index, local_index = self.locate(index)
+        with self.pool_lock:
+            return self.open_file(file_index).read_region(local_index, region)
+
+    def refresh(self):
+        """Pick up frames written to the newest file since the collection was opened
+
+        Returns:
+        --------
+        new_frames : int
+            Number of frames added to the end of the sequence
+        """
+        if not self.bin_files:
+            return 0
+
+        last = len(self.bin_files) - 1
+        with self.pool_lock:
+            rw = self.open_file(last)
+            known_frames = int(self.file_offsets[-1] - self.file_offsets[-2])
+            rw.refresh()
+            table = rw.frame_table(known_frames)
+            self.file_sizes[last] = rw.file_size
+
+        if len(table) == 0:
+            return 0
+
+        new_rows = np.empty(len(table), dtype=self.cached_frame_table.dtype)
+        for n in new_rows.dtype.names:
+            new_rows[n] = table[n]
+        self.cached_frame_table = np.concatenate([self.cached_frame_table, new_rows])
+        self.file_offsets[-1] += len(table)
+        self.file_size = sum(self.file_sizes)
+        self.cached_time_index = None
+        self.frames_in_file = int(self.file_offsets[-1])
+        return len(table)
+
+    def read_frame_header(self, index):
+
+        if index < 0 or index >= self.frames_in_file:
+            LOG.error('Error reading frame header ' + str(index) + ' from collection ' + self.filepath)
+            return None
+        return self.frame_header_dict(self.cached_frame_table[index].tolist())
+
+    def summary(self):
+        """Short description of the collection, see RawImage.summary, with the number of files"""
+
+        summary = {
+            'path': self.filepath,
+            'file_size': self.file_size,
+            'format': self.file_fmt,
+            'pixel_format': self.file_header['pixel_format'] if self.file_header else None,
+            'width': self.img_width,
+            'height': self.img_height,
+            'frames': self.frames_in_file,
+            'files': len(self.bin_files),
+            'start_time': None,
+            'end_time': None,
+            'duration': None
+        }
+        if self.frames_in_file > 0:
+            micros = self.cached_frame_table['system_micros']
+            summary['start_time'] = float(micros[0]) / 1e6
+            summary['end_time'] = float(micros[-1]) / 1e6
+            summary['duration'] = (int(micros[-1]) - int(micros[0])) / 1e6
+        return summary
+
+    def export_as_tiff(self, output_path=None, frames=None, **export_options):
+        """Export global frame indices, each bin file to its own tiff and json
+
+        Parameters:
+        -----------
+        output_path : str, optional
+            Directory to write to instead of next to each bin file
+        frames : sequence of int, optional
+            Global frame indices, see select_frames, all frames if None
+        export_options : dict
+            compression, tile and workers, passed on to RawImage.export_as_tiff
+
+        Returns:
+        --------
+        exported : list of (str, int)
+            Each bin file written and its number of frames
+        """
+        if frames is None:
+            frames = np.arange(self.frames_in_file)
+        frames = np.asarray(frames, dtype='int64')
+        if len(frames) == 0:
+            raise ValueError('No frames selected in ' + self.filepath)
+        file_indices = np.searchsorted(self.file_offsets, frames, side='right') - 1
+
+        exported = []
+        for file_index in np.unique(file_indices):
+            local = frames[file_indices == file_index] - self.file_offsets[file_index]
+            bin_file = self.bin_files[file_index]
+            LOG.info('Exporting ' + str(len(local)) + ' frames from ' + bin_file)
+
+            # exports take a while, use a private reader rather than one from the pool
+            rw = RawImage(bin_file, use_mmap=self.use_mmap, use_index=self.use_index)
+            rw.export_as_tiff(output_path=output_path, frames=local, **export_options)
+            rw.close()
+            exported.append((bin_file, len(local)))
+        return exported
+
+    def close(self):
+
+        with self.pool_lock:
+            while self.open_files:
+                _, rw = self.open_files.popitem(last=False)
+                rw.close()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+sidecar.py -- npz files cached next to a bin file and keyed on its size and mtime
+Author Paul L. D. Roberts
+Copyright 2020  Scripps Institution of Oceanography
+Distributed under MIT license. See license.txt for more information.
+"""
+
+import os
+import numpy as np
+from libs.logger import LOG
+
+
+def sidecar_path(raw_image, suffix):
+    """Path of a sidecar file of a reader, None for a collection that has no single file to cache next to"""
+
+    if raw_image.is_collection:
+        return None
+    return raw_image.filepath + suffix
+
+
+def load_sidecar(path, key, description):
+    """Arrays of a sidecar file, if it exists and was saved with the same key
+
+    Parameters:
+    -----------
+    path : str or None
+        Path of the sidecar file, nothing is loaded if None
+    key : tuple of int
+        Format version followed by whatever the contents depend on, usually the size and
+        mtime of the bin file from RawImage.index_key
+    description : str
+        What the file holds, for the log
+
+    Returns:
+    --------
+    arrays : dict of np.ndarray or None
+        Arrays saved with save_sidecar, None if the file is missing, stale or unreadable
+    """
+    if path is None or not os.path.exists(path):
+        return None
+
+    try:
+        with np.load(path, allow_pickle=False) as sidecar:
+            if 'key' not in sidecar.files or tuple(int(k) for k in sidecar['key']) != tuple(key):
+                LOG.info('Stale ' + description + ': ' + path)
+                return None
+            arrays = {name: sidecar[name] for name in sidecar.files if name != 'key'}
+    except (OSError, ValueError, KeyError) as e:
+        LOG.warning('Could not read ' + description + ' ' + path + ': ' + str(e))
+        return None
+
+    LOG.info('Loaded ' + description + ': ' + path)
+    return arrays
+
+
+def save_sidecar(path, key, description, **arrays):
+    """Save arrays with their key, see load_sidecar, returns True if the file was written"""
+
+    if path is None:
+        return False
+
+    # write to a temp file first so a reader never sees a partial file
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, key=np.array(key, dtype='int64'), **arrays)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        LOG.warning('Could not write ' + description + ' ' + path + ': ' + str(e))
+        return False
+
+    LOG.info('Wrote ' + description + ': ' + path)
+    return True
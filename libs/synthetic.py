@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+synthetic.py -- write synthetic BUMP bin files for benchmarks and testing
+Author Paul L. D. Roberts
+Copyright 2020  Scripps Institution of Oceanography
+Distributed under MIT license. See license.txt for more information.
+"""
+
+import struct
+import numpy as np
+from libs.raw_image import (FILE_HEADER_FORMAT, FILE_HEADER_PARAMS, FRAME_HEADER_FORMAT, FRAME_HEADER_PARAMS,
+                            FRAME_HEADER_FORMAT_FMT2, FRAME_HEADER_PARAMS_FMT2)
+
+
+def synthetic_scene(height, width, pixel_format, seed=0):
+    """Mostly dark Bayer frame with a few bright blobs and sensor noise, like a BUMP image"""
+
+    rng = np.random.default_rng(seed)
+    max_value = 2**(8 * pixel_format) - 1
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    scene = np.full((height, width), 0.03, dtype=np.float32)
+    for i in range(8):
+        cy, cx = rng.uniform(0, height), rng.uniform(0, width)
+        radius = rng.uniform(0.01, 0.05) * min(height, width)
+        scene += rng.uniform(0.2, 0.8) * np.exp(-((y - cy)**2 + (x - cx)**2) / (2 * radius**2))
+    scene += rng.normal(0, 0.005, scene.shape).astype(np.float32)
+    dtype = np.uint8 if pixel_format == 1 else np.uint16
+    return (np.clip(scene, 0, 1) * max_value).astype(dtype)
+
+
+def write_bin_file(filepath, frames=10, width=640, height=480, pixel_format=2, file_fmt=2,
+                   vert_binning=1, horz_binning=1, frame_rate=10.0, start_time=1600000000.0,
+                   dropped=(), partial_frame=False, seed=0):
+    """Write a bin file with the same header layouts RawImage reads
+
+    Parameters:
+    -----------
+    filepath : str
+        Path of the bin file to write
+    frames : int
+        Number of frames
+    width, height : int
+        Image size after binning
+    pixel_format : {1, 2}
+        Bytes per pixel
+    file_fmt : {1, 2}
+        File format, format 2 frame headers add position and flashtype
+    vert_binning, horz_binning : int
+        Binning written to the file header, the raw sensor size is the image size times these
+    frame_rate : float
+        Frames per second used for the frame timestamps
+    start_time : float
+        Unix time of the first frame
+    dropped : sequence of int
+        Frame numbers to leave out, to simulate dropped frames
+    partial_frame : bool
+        Append half a frame at the end, like a file that is still being written
+    seed : int
+        Seed for the image content
+
+    Returns:
+    --------
+    bytes_written : int
+        Size of the file
+    """
+    header_length = struct.calcsize(FILE_HEADER_FORMAT)
+    file_header = dict.fromkeys(FILE_HEADER_PARAMS, 0)
+    file_header.update({
+        'length': header_length,
+        'format': file_fmt,
+        'camera_id': 1,
+        'pixel_format': pixel_format,
+        'illumination_type': 1,
+        'flash_duration': 10.0,
+        'flash_delay': 0.0,
+        'exposure_time': 1000.0,
+        'gain': 1.0,
+        'red_gain': 1.4,
+        'blue_gain': 1.7,
+        'vert_binning': vert_binning,
+        'horz_binning': horz_binning,
+        'raw_image_height': height * vert_binning,
+        'raw_image_width': width * horz_binning
+    })
+
+    if file_fmt == 1:
+        frame_format, frame_params = FRAME_HEADER_FORMAT, FRAME_HEADER_PARAMS
+    else:
+        frame_format, frame_params = FRAME_HEADER_FORMAT_FMT2, FRAME_HEADER_PARAMS_FMT2
+
+    # a few base images shifted per frame so consecutive frames differ without generating each one
+    scenes = [synthetic_scene(height, width, pixel_format, seed + i) for i in range(4)]
+    dropped = set(dropped)
+
+    with open(filepath, 'wb') as f:
+        f.write(struct.pack(FILE_HEADER_FORMAT, *[file_header[p] for p in FILE_HEADER_PARAMS]))
+
+        frame_number = 0
+        written = 0
+        pixels = None
+        while written < frames:
+            if frame_number in dropped:
+                frame_number += 1
+                continue
+            micros = int((start_time + frame_number / frame_rate) * 1e6)
+            frame_header = dict.fromkeys(frame_params, 0)
+            frame_header.update({
+                'unixtime': micros // 1000000,
+                'system_micros': micros,
+                'camera_micros,': micros - int(start_time * 1e6),
+                'frame_number': frame_number,
+                'width': width,
+                'height': height,
+                'flashtype': 1
+            })
+            pixels = np.roll(scenes[frame_number % len(scenes)], 2 * frame_number, axis=1)
+            f.write(struct.pack(frame_format, *[frame_header[p] for p in frame_params]))
+            f.write(pixels.tobytes())
+            frame_number += 1
+            written += 1
+
+        if partial_frame and pixels is not None:
+            f.write(struct.pack(frame_format, *[0] * len(frame_params)))
+            f.write(pixels.tobytes()[:pixels.nbytes // 2])
+
+        return f.tell()
@@ -1,31 +1,168 @@
 from pyqtgraph.Qt import QtCore
 import pyqtgraph as pg
 from libs.raw_image import RawImage
+from libs.raw_image_collection import RawImageCollection
 from libs.logger import LOG
+from libs.frame_cache import FrameCache
+from libs.prefetch import PrefetchScheduler
+from libs.image_tools import DisplayDecoder
+from libs.frame_stats import FrameStats, DEFAULT_SUBSAMPLE
+from libs.thumbnails import Thumbnails
+from libs.tile_pyramid import TilePyramid, decode_tile
+from libs.file_tools import scan_bin_files
+import os
+import numpy as np
 import multiprocessing
-import time
-import cv2
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+def open_raw_image(bin_path):
+    """Reader for one bin file, or for a list of bin files played as one sequence"""
+
+    if isinstance(bin_path, (list, tuple)):
+        return RawImageCollection(bin_path)
+    return RawImage(bin_path, use_mmap=True, use_index=True)
+
 
 class RawImageExporter(QtCore.QThread):
 
-    exportDone = QtCore.Signal(bool)
+    # done, and the error message when the export failed
+    exportDone = QtCore.Signal(bool, str)
 
-    def __init__(self, bin_path, output_path=None):
+    def __init__(self, bin_path, output_path=None, selection=None, export_options=None):
         QtCore.QThread.__init__(self)
         self.bin_path = bin_path
         self.output_path = output_path
+        self.selection = selection or {}
+        self.export_options = export_options or {}
 
     def __del__(self):
         self.wait()
 
     def run(self):
 
-        rw = RawImage(self.bin_path)
-        rw.export_as_tiff(output_path=self.output_path)
-        self.exportDone.emit(True)
+        rw = None
+        error = ''
+        try:
+            rw = open_raw_image(self.bin_path)
+            frames = rw.select_frames(**self.selection)
+            rw.export_as_tiff(output_path=self.output_path, frames=frames, **self.export_options)
+        except Exception as e:
+            # a disk that is full or a file that went away must still end the export
+            error = str(e) or repr(e)
+            LOG.error('Export of ' + str(self.bin_path) + ' failed: ' + error)
+        finally:
+            if rw is not None:
+                rw.close()
+        self.exportDone.emit(not error, error)
         self.deleteLater()
 
 
+class DirectoryScanner(QtCore.QThread):
+    """List the bin files in a directory tree in the background, then read a header
+    summary of each one (file header plus first and last frame headers)"""
+
+    fileFound = QtCore.Signal(str)
+    fileSummary = QtCore.Signal(str, object)
+    scanDone = QtCore.Signal(bool)
+
+    def __init__(self, dir_path):
+        QtCore.QThread.__init__(self)
+        self.dir_path = dir_path
+        self.cancelled = False
+
+    def __del__(self):
+        self.wait()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def is_cancelled(self):
+        return self.cancelled
+
+    def run(self):
+
+        bin_files = []
+        for bin_file in scan_bin_files(self.dir_path, self.is_cancelled):
+            bin_files.append(bin_file)
+            self.fileFound.emit(bin_file)
+
+        for bin_file in bin_files:
+            if self.cancelled:
+                break
+            try:
+                rw = RawImage(bin_file)
+                if rw.file_valid:
+                    self.fileSummary.emit(bin_file, rw.summary())
+                rw.close()
+            except Exception as e:
+                LOG.error('Could not read header of ' + bin_file + ': ' + repr(e))
+
+        self.scanDone.emit(not self.cancelled)
+
+
+class FrameStatsLoader(QtCore.QThread):
+    """Load the cached frame statistics of a file, or compute them, in the background"""
+
+    statsReady = QtCore.Signal(object)
+
+    def __init__(self, raw_image, subsample=DEFAULT_SUBSAMPLE):
+        QtCore.QThread.__init__(self)
+        self.raw_image = raw_image
+        self.subsample = subsample
+        self.cancelled = False
+
+    def __del__(self):
+        self.wait()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def is_cancelled(self):
+        return self.cancelled
+
+    def run(self):
+
+        try:
+            stats = FrameStats(self.raw_image, self.subsample, cancelled=self.is_cancelled).get()
+        except Exception as e:
+            LOG.error('Could not compute frame statistics of ' + self.raw_image.filepath + ': ' + repr(e))
+            return
+        if stats is not None:
+            self.statsReady.emit(stats)
+
+
+class ThumbnailLoader(QtCore.QThread):
+    """Load the cached thumbnails of a file, or build them, in the background"""
+
+    thumbnailsReady = QtCore.Signal(object)
+
+    def __init__(self, raw_image):
+        QtCore.QThread.__init__(self)
+        self.raw_image = raw_image
+        self.cancelled = False
+
+    def __del__(self):
+        self.wait()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def is_cancelled(self):
+        return self.cancelled
+
+    def run(self):
+
+        try:
+            thumbnails = Thumbnails(self.raw_image, cancelled=self.is_cancelled).get()
+        except Exception as e:
+            LOG.error('Could not build thumbnails of ' + self.raw_image.filepath + ': ' + repr(e))
+            return
+        if thumbnails is not None:
+            self.thumbnailsReady.emit(thumbnails)
+
+
 class RawImageLoader(QtCore.QThread):
 
     # signals
@@ -33,63 +170,323 @@ class RawImageLoader(QtCore.QThread):
     imagesLoaded = QtCore.Signal(float)
     loadingDone = QtCore.Signal(bool)
     setRawFrames = QtCore.Signal(object)
+    frameReady = QtCore.Signal(int)
+    tileReady = QtCore.Signal(int, object)
+
+    # default cache budgets as fractions of the RAM available when the file is opened
+    RAW_CACHE_FRACTION = 0.1
+    DISPLAY_CACHE_FRACTION = 0.15
 
-    def __init__(self, bin_path, pycon=None):
+    # rows of the overview image decoded for every frame, finer detail is decoded in tiles
+    DISPLAY_HEIGHT = 1080
+    TILE_CACHE_BYTES = 128 * 1024 * 1024
+
+    def __init__(self, bin_path, pycon=None, raw_cache_bytes=None, display_cache_bytes=None, workers=None,
+                 tile_cache_bytes=TILE_CACHE_BYTES):
         QtCore.QThread.__init__(self)
         self.bin_path = bin_path
         self.bin_loaded = False
+        self.stopped = False
         self.playing = False
         self.frame_rate = 30
         self.frame_index = 0
         self.last_displayed_index = 0
         self.raw_image = None
 
-        self.raw_image = RawImage(self.bin_path)
-        self.frame_header = []
-        self.frame_data = []
-        self.display_data = []
+        self.raw_image = open_raw_image(self.bin_path)
+        self.frame_table = self.raw_image.frame_table()
+
+        if raw_cache_bytes is None:
+            raw_cache_bytes = self.RAW_CACHE_FRACTION * self.raw_image.ram_available
+        if display_cache_bytes is None:
+            display_cache_bytes = self.DISPLAY_CACHE_FRACTION * self.raw_image.ram_available
+
+        # full resolution raw frames and resized RGB frames are cached separately
+        self.raw_cache = FrameCache(raw_cache_bytes, 'raw')
+        self.display_cache = FrameCache(display_cache_bytes, 'display')
+
+        # tiles of the detail levels, keyed by (frame index, level, row, col)
+        self.pyramid = TilePyramid(self.raw_image.img_width, self.raw_image.img_height, self.DISPLAY_HEIGHT)
+        self.tile_cache = FrameCache(tile_cache_bytes, 'tiles')
+        self.wanted_tiles = set()
+        self.tile_lock = threading.Lock()
+
+        # decode order follows the displayed frame, start with the window after frame 0
+        self.scheduler = PrefetchScheduler(self.raw_image.frames_in_file)
+        self.scheduler.plan(0)
+
+        # frames are decoded on a pool, each thread with its own decoder buffers
+        if workers is None or workers < 1:
+            workers = os.cpu_count() or 1
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=self.workers)
+        self.thread_data = threading.local()
+        self.display_transform = None
+        self.display_generation = 0
 
-        for ind in range(0, self.raw_image.frames_in_file):
-            self.frame_header.append(None)
-            self.frame_data.append(None)
-            self.display_data.append(None)
+        # notified every time a frame is added to the display cache or fails to decode
+        self.frame_loaded = threading.Condition()
+        self.failed_frames = set()
 
     def __del__(self):
         self.wait()
 
-    def get_frame(self, index):
-        if index < self.raw_image.frames_in_file:
-            while self.frame_header[index] is None:
-                time.sleep(0.2)
-                LOG.info('Waiting for frame: ' + str(index) + '...')
+    def stop(self):
+        """Stop decoding, disconnect the signals and close the file
 
-            return self.frame_header[index], self.display_data[index]
-        else:
+        Blocks until the loader thread and the decode pool are done, the loader can not be
+        used afterwards.
+        """
+        self.stopped = True
+        for signal in (self.frameReady, self.tileReady, self.loadingDone, self.imagesLoaded, self.setRawFrames):
+            try:
+                signal.disconnect()
+            except TypeError:
+                # nothing connected
+                pass
+        self.scheduler.stop()
+        self.wait()
+        self.pool.shutdown(wait=True)
+        self.raw_image.close()
+
+    def frame_header(self, index):
+        return self.raw_image.frame_header_dict(self.frame_table[index].tolist())
+
+    def refresh(self):
+        """Pick up frames appended to the file since it was opened, see RawImage.refresh
+
+        Returns:
+        --------
+        new_frames : int
+            Number of frames added, the new frames are decoded on request like any other
+        """
+        old_frames = self.raw_image.frames_in_file
+        new_frames = self.raw_image.refresh()
+        if new_frames > 0:
+            self.frame_table = np.concatenate([self.frame_table, self.raw_image.frame_table(old_frames)])
+            self.scheduler.set_frame_count(self.raw_image.frames_in_file)
+        return new_frames
+
+    def cache_stats(self):
+        return {
+            'raw': self.raw_cache.stats(),
+            'display': self.display_cache.stats(),
+            'tiles': self.tile_cache.stats()
+        }
+
+    def cache_capacity(self):
+        # number of display frames that fit in the budget, unknown until one is decoded
+        if self.display_cache.last_item_bytes > 0:
+            return int(self.display_cache.max_bytes / self.display_cache.last_item_bytes)
+        return None
+
+    def seek(self, index, direction=1, rate=0.0):
+        """Re-plan prefetching around the frame being displayed
+
+        Parameters:
+        -----------
+        index : int
+            Frame that is being displayed
+        direction : {1, -1}
+            Playback or stepping direction
+        rate : float
+            Playback rate in frames/s, 0 when not playing
+        """
+        self.frame_index = index
+        self.scheduler.plan(index, direction, rate, self.cache_capacity())
+
+    def get_frame(self, index, timeout=None):
+        """Return the header and display image of a frame, blocking until it is decoded
+
+        A cache miss puts the frame at the front of the decode queue and waits only for
+        that frame. If the loader thread is not running the frame is decoded directly.
+        Returns None if the frame could not be decoded or the wait timed out.
+        """
+        if index >= self.raw_image.frames_in_file:
             LOG.error('Frame index ' + str(index) + ' is out of bounds [0,' + str(self.raw_image.frames_in_file) + ']')
+            return None
+        if index in self.failed_frames:
+            return None
+
+        image = self.display_cache.get(index)
+        if image is None:
+            if not self.isRunning():
+                image = self.load_frame(index)
+            else:
+                LOG.info('Frame ' + str(index) + ' not in cache, waiting...')
+                image = self.wait_for_frame(index, timeout)
+        if image is None:
+            return None
+
+        return self.frame_header(index), image
+
+    def wait_for_frame(self, index, timeout=None):
+        found = []
+
+        def loaded():
+            image = self.display_cache.get(index)
+            if image is not None:
+                found.append(image)
+            return image is not None or index in self.failed_frames
+
+        with self.frame_loaded:
+            self.scheduler.request(index)
+            if self.frame_loaded.wait_for(loaded, timeout):
+                return found[0] if found else None
+
+        LOG.error('Timed out waiting for frame ' + str(index))
+        return None
+
+    def request_frame(self, index):
+        """Non-blocking variant of get_frame, frameReady is emitted once the frame is cached or has failed"""
+
+        if index in self.display_cache or index in self.failed_frames:
+            self.frameReady.emit(index)
+        else:
+            self.scheduler.request(index)
+
+    def get_raw_frame(self, index):
+        frame = self.raw_cache.get(index)
+        if frame is None:
+            _, frame = self.raw_image.read_frame(index)
+            self.raw_cache.put(index, frame)
+        return frame
+
+    def display_image(self, frame):
+        decoder = getattr(self.thread_data, 'decoder', None)
+        if decoder is None:
+            decoder = DisplayDecoder(self.DISPLAY_HEIGHT)
+            self.thread_data.decoder = decoder
+        decoder.transform = self.display_transform
+        return decoder.decode(frame)
+
+    def request_tiles(self, index, tiles):
+        """Decode the tiles shown for a frame in the background, replacing any earlier request
+
+        tileReady is emitted with the frame index and the (level, row, col) of each tile once
+        it is in tile_cache, right away for tiles that are already there. Tiles of an earlier
+        request that have not started decoding are skipped.
+
+        Parameters:
+        -----------
+        index : int
+            Frame index
+        tiles : list of tuple
+            (level, row, col) of each tile, see TilePyramid.visible_tiles
+        """
+        keys = [(index,) + tuple(tile) for tile in tiles]
+        with self.tile_lock:
+            self.wanted_tiles = set(keys)
+        for key in keys:
+            if key in self.tile_cache:
+                self.tileReady.emit(index, key[1:])
+            else:
+                self.pool.submit(self.load_tile, key, self.display_generation)
+
+    def load_tile(self, key, generation):
+
+        with self.tile_lock:
+            if key not in self.wanted_tiles or key in self.tile_cache:
+                return
+        decoder = getattr(self.thread_data, 'tile_decoder', None)
+        if decoder is None:
+            decoder = DisplayDecoder(self.DISPLAY_HEIGHT)
+            self.thread_data.tile_decoder = decoder
+        decoder.transform = self.display_transform
+
+        try:
+            region, crop = self.pyramid.read_region(key[1:])
+            _, data = self.raw_image.read_region(key[0], region)
+            image = decode_tile(decoder, data, key[1], crop)
+        except Exception as e:
+            LOG.error('Error decoding tile ' + str(key) + ' from ' + self.raw_image.filepath + ': ' + repr(e))
+            return
+
+        # drop tiles decoded with a transform that changed while decoding
+        if generation == self.display_generation:
+            self.tile_cache.put(key, image)
+            self.tileReady.emit(key[0], key[1:])
+
+    def set_display_transform(self, transform):
+        """Change the display transform and re-render cached frames from the raw cache
+
+        Parameters:
+        -----------
+        transform : DisplayTransform or None
+            Window, gamma and white balance to apply, None for a plain 8-bit reduction
+        """
+        self.display_transform = transform
+        self.display_generation += 1
+        self.display_cache.clear()
+        self.tile_cache.clear()
+        self.seek(self.frame_index)
+
+    def decode_frame(self, index):
+        return self.display_image(self.get_raw_frame(index))
+
+    def store_frame(self, index, image, generation):
+        # drop frames decoded with a transform that changed while decoding
+        if generation == self.display_generation:
+            self.display_cache.put(index, image)
+        with self.frame_loaded:
+            self.frame_loaded.notify_all()
+        self.frameReady.emit(index)
+
+    def store_failure(self, index):
+        # wake anyone waiting for the frame, get_frame returns None for it from now on
+        with self.frame_loaded:
+            self.failed_frames.add(index)
+            self.frame_loaded.notify_all()
+        self.frameReady.emit(index)
+
+    def load_frame(self, index):
+        generation = self.display_generation
+        try:
+            image = self.decode_frame(index)
+        except Exception as e:
+            LOG.error('Error decoding frame ' + str(index) + ' from ' + self.raw_image.filepath + ': ' + repr(e))
+            self.store_failure(index)
+            return None
+        self.store_frame(index, image, generation)
+        return image
 
     def run_load_frames(self):
-        index = 0
-
-        while index < self.raw_image.frames_in_file:
-            if self.frame_header[index] is None:
-                (self.frame_header[index], self.frame_data[index]) = self.raw_image.read_frame(index)
-                #TODO: add controls from UI to adjust color and resolution conversion
-                if self.raw_image.file_header['pixel_format'] == 2:
-                    image = (self.frame_data[index] / 256).astype('uint8')
-                image = cv2.cvtColor(image, cv2.COLOR_BayerRG2BGR)
-                scale = 1080/image.shape[0]
-                image = cv2.resize(image, (int(image.shape[1]*scale), int(image.shape[0]*scale)))
-                self.display_data[index] = image
-            index += 1
-            LOG.info('Loading frame: ' +str(index) + '...')
-        self.bin_loaded = True
-        self.loadingDone.emit(True)
+
+        # keep up to one frame per worker in flight, taken from the scheduler in priority
+        # order, and store the results in the same order
+        loaded = False
+        pending = deque()
+        while True:
+            while len(pending) < self.workers:
+                index = self.scheduler.next()
+                if index is None:
+                    break
+                if index in self.display_cache or index in self.failed_frames:
+                    continue
+                if all(index != p[0] for p in pending):
+                    pending.append((index, self.display_generation, self.pool.submit(self.decode_frame, index)))
+
+            if not pending:
+                break
+
+            index, generation, future = pending.popleft()
+            try:
+                self.store_frame(index, future.result(), generation)
+                loaded = True
+                LOG.info('Loaded frame: ' + str(index))
+            except Exception as e:
+                LOG.error('Error decoding frame ' + str(index) + ' from ' + self.raw_image.filepath + ': ' + repr(e))
+                self.store_failure(index)
+
+        if loaded:
+            self.bin_loaded = True
+            self.loadingDone.emit(True)
 
     def run(self):
 
-        while self.isRunning:
+        while not self.stopped:
 
-            if not self.bin_loaded:
-                self.run_load_frames()
+            self.run_load_frames()
 
-            time.sleep(0.1)
+            # sleep until a seek or a frame request queues more work
+            self.scheduler.wait(0.5)
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+thumbnails.py -- tiny color previews of the frames of a bin file, cached next to the file
+Author Paul L. D. Roberts
+Copyright 2020  Scripps Institution of Oceanography
+Distributed under MIT license. See license.txt for more information.
+"""
+
+import os
+import time
+import threading
+import cv2
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from libs.raw_image import RawImage
+from libs.image_tools import DisplayDecoder, DisplayTransform
+from libs.logger import LOG
+from libs.sidecar import sidecar_path, load_sidecar, save_sidecar
+
+# bump when the contents of the thumbnail file change so old files get rebuilt
+THUMBNAIL_VERSION = 1
+
+DEFAULT_THUMBNAIL_HEIGHT = 128
+
+# without an explicit step, every Nth frame is used so a file has at most this many thumbnails
+MAX_THUMBNAILS = 1000
+
+# the display levels of the thumbnails come from the percentiles of this many frames
+LEVEL_SAMPLE_FRAMES = 16
+LEVEL_PERCENTILES = (1, 99.9)
+
+
+def bayer_subsample(frame, step):
+    """Smaller Bayer mosaic made of every step-th 2x2 cell in each direction
+
+    Only the rows of the cells that are kept are read from a memory mapped frame.
+    """
+    if step <= 1:
+        return frame
+    height, width = frame.shape
+    cells = frame[:height // 2 * 2, :width // 2 * 2].reshape(height // 2, 2, width // 2, 2)[::step, :, ::step, :]
+    return cells.reshape(cells.shape[0] * 2, cells.shape[2] * 2)
+
+
+class Thumbnails:
+    """Thumbnails of every step-th frame, all in one array saved to <bin file>.thumbs.npz
+
+    Each frame is reduced to a Bayer mosaic of about twice the thumbnail height by
+    skipping cells, then decoded with the superpixel path of DisplayDecoder, so a
+    thumbnail costs a few hundred rows of reads and no full-resolution demosaic. Black and
+    white levels are set from a few frames spread through the file so dim data is visible.
+    The file is keyed on the size and mtime of the bin file, the height and the step.
+
+    Attributes, after compute or load:
+        frames : frame index of each thumbnail
+        images : (thumbnails, height, width, 3) uint8 in the channel order of DisplayDecoder
+        levels : black and white raw levels the thumbnails were mapped with
+    """
+
+    def __init__(self, raw_image, height=DEFAULT_THUMBNAIL_HEIGHT, step=None, workers=None, cancelled=None):
+
+        self.raw_image = raw_image
+        self.height = height
+        if step is None:
+            step = max(int(np.ceil(raw_image.frames_in_file / MAX_THUMBNAILS)), 1)
+        self.step = step
+        if workers is None or workers < 1:
+            workers = os.cpu_count() or 1
+        self.workers = workers
+        self.cancelled = cancelled
+        self.transform = None
+        self.thread_data = threading.local()
+
+        self.thumbs_path = sidecar_path(raw_image, '.thumbs.npz')
+
+        self.frames = None
+        self.images = None
+        self.levels = None
+
+    def get(self):
+        """Load the cached thumbnails, or build and cache them, None if cancelled while building"""
+
+        if not self.load():
+            self.compute()
+            if self.is_cancelled():
+                return None
+            self.save()
+        return self
+
+    def is_cancelled(self):
+        return self.cancelled is not None and self.cancelled()
+
+    def thumbnail(self, frame):
+        """Thumbnail of one raw frame, decoded with a decoder owned by the calling thread"""
+
+        decoder = getattr(self.thread_data, 'decoder', None)
+        if decoder is None:
+            decoder = DisplayDecoder(self.height, self.transform)
+            self.thread_data.decoder = decoder
+        return decoder.decode(self.mosaic(frame))
+
+    def mosaic(self, frame):
+
+        return bayer_subsample(frame, max(frame.shape[0] // (2 * self.height), 1))
+
+    def compute_levels(self):
+
+        if self.raw_image.frames_in_file == 0:
+            return np.array([0, 2**(8 * self.raw_image.file_header['pixel_format']) - 1])
+        samples = np.unique(np.linspace(0, self.raw_image.frames_in_file - 1, LEVEL_SAMPLE_FRAMES).astype(int))
+        values = []
+        for index in samples:
+            frame = self.raw_image.read_frame(int(index))
+            if frame is not None:
+                values.append(self.mosaic(frame[1]).ravel())
+        if not values:
+            return np.array([0, 2**(8 * self.raw_image.file_header['pixel_format']) - 1])
+        black, white = np.percentile(np.concatenate(values), LEVEL_PERCENTILES)
+        return np.array([int(black), max(int(np.ceil(white)), int(black) + 1)])
+
+    def compute_thumbnail(self, page):
+
+        if self.is_cancelled():
+            return
+        frame = self.raw_image.read_frame(int(self.frames[page]))
+        if frame is not None:
+            image = self.thumbnail(frame[1])
+            self.images[page, :image.shape[0], :image.shape[1]] = image
+
+    def compute(self):
+
+        self.frames = np.arange(0, self.raw_image.frames_in_file, self.step)
+        self.levels = self.compute_levels()
+        self.transform = DisplayTransform(black=int(self.levels[0]), white=int(self.levels[1]))
+        mosaic = self.mosaic(np.empty((self.raw_image.img_height, self.raw_image.img_width), dtype=np.uint8))
+        width = DisplayDecoder(self.height).output_size(mosaic.shape)[0]
+        self.images = np.zeros((len(self.frames), self.height, width, 3), dtype=np.uint8)
+
+        LOG.info('Building ' + str(len(self.frames)) + ' thumbnails of ' + self.raw_image.filepath)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(self.compute_thumbnail, range(len(self.frames))))
+
+    def cache_key(self):
+
+        file_size, mtime_ns = self.raw_image.index_key()
+        return THUMBNAIL_VERSION, file_size, mtime_ns, self.height, self.step
+
+    def load(self):
+        """Load the thumbnail file if it matches the bin file, height and step, returns True if loaded"""
+
+        if self.thumbs_path is None:
+            return False
+        thumbs = load_sidecar(self.thumbs_path, self.cache_key(), 'thumbnails')
+        if thumbs is None:
+            return False
+        try:
+            self.frames = thumbs['frames']
+            self.images = thumbs['images']
+            self.levels = thumbs['levels']
+        except KeyError as e:
+            LOG.warning('Could not read thumbnails ' + self.thumbs_path + ': ' + str(e))
+            return False
+        return True
+
+    def save(self):
+
+        if self.thumbs_path is None:
+            return
+        save_sidecar(self.thumbs_path, self.cache_key(), 'thumbnails',
+                     frames=self.frames, images=self.images, levels=self.levels)
+
+    def nearest(self, index):
+        """Position of the thumbnail closest to frame index, or None if there are none"""
+
+        if self.frames is None or len(self.frames) == 0:
+            return None
+        return int(np.clip(np.round(index / self.step), 0, len(self.frames) - 1))
+
+    def contact_sheet(self, columns=10, count=None, spacing=2):
+        """Grid of thumbnails evenly spaced through the file, left to right and top to bottom
+
+        Parameters:
+        -----------
+        columns : int
+            Thumbnails per row
+        count : int, optional
+            Number of thumbnails to show, all of them if None
+        spacing : int
+            Black pixels between thumbnails
+
+        Returns:
+        --------
+        sheet : np.ndarray
+            uint8 image in the channel order of the thumbnails
+        frames : np.ndarray
+            Frame index of each cell of the grid, in row-major order
+        """
+        pages = np.arange(len(self.frames))
+        if count is not None and count < len(pages):
+            pages = np.unique(np.linspace(0, len(pages) - 1, count).round().astype(int))
+
+        rows = max(int(np.ceil(len(pages) / columns)), 1)
+        height, width = self.images.shape[1:3]
+        sheet = np.zeros((rows * (height + spacing) + spacing, columns * (width + spacing) + spacing, 3),
+                         dtype=np.uint8)
+        for cell, page in enumerate(pages):
+            y = spacing + (cell // columns) * (height + spacing)
+            x = spacing + (cell % columns) * (width + spacing)
+            sheet[y:y + height, x:x + width] = self.images[page]
+        return sheet, self.frames[pages]
+
+
+def write_contact_sheet(bin_path, output_path, columns=10, count=100, height=DEFAULT_THUMBNAIL_HEIGHT):
+    """Build or load the thumbnails of one bin file and write a contact sheet PNG
+
+    Returns the path of the PNG, or None if the bin file could not be read.
+    """
+    try:
+        raw_image = RawImage(bin_path, use_mmap=True, use_index=True)
+    except Exception as e:
+        LOG.error('Could not open ' + bin_path + ': ' + repr(e))
+        return None
+    if not raw_image.file_valid:
+        LOG.error('Could not open ' + bin_path)
+        return None
+    try:
+        thumbnails = Thumbnails(raw_image, height, workers=1).get()
+    except Exception as e:
+        LOG.error('Could not build thumbnails of ' + bin_path + ': ' + repr(e))
+        return None
+    finally:
+        raw_image.close()
+
+    sheet, frames = thumbnails.contact_sheet(columns, count)
+    if not cv2.imwrite(output_path, sheet):
+        LOG.error('Could not write ' + output_path)
+        return None
+    LOG.info('Wrote contact sheet of ' + str(len(frames)) + ' frames: ' + output_path)
+    return output_path
+
+
+def write_contact_sheets(bin_files, output_dir=None, columns=10, count=100, height=DEFAULT_THUMBNAIL_HEIGHT,
+                         jobs=None):
+    """Write <name>_contact.png for each bin file with a pool of worker processes
+
+    Parameters:
+    -----------
+    bin_files : list of str
+        Paths to the bin files
+    output_dir : str, optional
+        Directory for the PNGs instead of the directory of each bin file
+    columns, count : int
+        Thumbnails per row and in total, spread evenly through each file
+    height : int
+        Thumbnail height in pixels
+    jobs : int, optional
+        Number of worker processes, defaults to the number of CPUs
+
+    Returns:
+    --------
+    outputs : list of str or None
+        Path of each PNG, None for files that failed, in the order of bin_files
+    """
+    if jobs is None or jobs < 1:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, max(len(bin_files), 1))
+
+    output_paths = []
+    for bin_file in bin_files:
+        name = os.path.splitext(os.path.basename(bin_file))[0] + '_contact.png'
+        output_paths.append(os.path.join(output_dir if output_dir else os.path.dirname(bin_file), name))
+
+    LOG.info('Writing ' + str(len(bin_files)) + ' contact sheets with ' + str(jobs) + ' worker(s)')
+
+    start = time.time()
+    arguments = (bin_files, output_paths, [columns] * len(bin_files), [count] * len(bin_files),
+                 [height] * len(bin_files))
+    if jobs == 1:
+        outputs = list(map(write_contact_sheet, *arguments))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            outputs = list(pool.map(write_contact_sheet, *arguments))
+
+    LOG.info('Contact sheets finished: ' + str(sum(o is not None for o in outputs)) + ' of ' +
+             str(len(outputs)) + ' in ' + '%.1f' % (time.time() - start) + ' s')
+    return outputs
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+tiff_tools.py -- encode frames into compressed tiff strips or tiles outside of the tiff writer
+Author Paul L. D. Roberts
+Copyright 2020  Scripps Institution of Oceanography
+Distributed under MIT license. See license.txt for more information.
+"""
+
+import zlib
+import struct
+import numpy as np
+
+# compression names accepted for export, all lossless
+COMPRESSION_TYPES = ['none', 'zlib', 'deflate', 'lzw']
+
+
+def horizontal_difference(data):
+    """Apply the tiff horizontal differencing predictor (predictor 2) to a 2D integer array"""
+
+    diff = data.copy()
+    # unsigned subtraction wraps around exactly as the predictor expects
+    np.subtract(data[:, 1:], data[:, :-1], out=diff[:, 1:])
+    return diff
+
+
+def bin_bayer(data, factor):
+    """Average factor x factor blocks of each Bayer plane, the result keeps the 2x2 mosaic
+
+    The height and width of data must be multiples of 2 * factor.
+    """
+    if factor == 1:
+        return data
+
+    height, width = data.shape
+    # rows and columns split into (output block, pixel within the block, Bayer site)
+    blocks = data.reshape(height // (2 * factor), factor, 2, width // (2 * factor), factor, 2)
+    total = blocks.sum(axis=(1, 4), dtype=np.uint32)
+    binned = (total + factor * factor // 2) // (factor * factor)
+    return binned.reshape(height // factor, width // factor).astype(data.dtype)
+
+
+def truncate_tiff(tiff_path, size, pages):
+    """Cut a tiff file back to its first pages so more pages can be appended to it
+
+    Parameters:
+    -----------
+    tiff_path : str
+        Classic or BigTIFF file written page by page
+    size : int
+        File size right after the last page to keep was written
+    pages : int
+        Number of pages to keep, at least 1; the IFD chain is ended after the last one
+    """
+    with open(tiff_path, 'r+b') as f:
+        f.truncate(size)
+        header = f.read(16)
+        byteorder = '<' if header[:2] == b'II' else '>'
+        if struct.unpack(byteorder + 'H', header[2:4])[0] == 43:
+            count_format, offset_format, entry_size = 'Q', 'Q', 20
+            offset = struct.unpack(byteorder + 'Q', header[8:16])[0]
+        else:
+            count_format, offset_format, entry_size = 'H', 'I', 12
+            offset = struct.unpack(byteorder + 'I', header[4:8])[0]
+
+        # follow the chain to the last kept IFD, its next pointer may point past the cut
+        for _ in range(pages):
+            f.seek(offset)
+            count = struct.unpack(byteorder + count_format, f.read(struct.calcsize(count_format)))[0]
+            pointer = offset + struct.calcsize(count_format) + count * entry_size
+            f.seek(pointer)
+            offset = struct.unpack(byteorder + offset_format, f.read(struct.calcsize(offset_format)))[0]
+
+        f.seek(pointer)
+        f.write(struct.pack(byteorder + offset_format, 0))
+
+
+def frame_tiles(data, tile):
+    """Split a frame into row-major tiles, zero padding the tiles on the right and bottom edges"""
+
+    tile_height, tile_width = tile
+    height, width = data.shape
+    for y in range(0, height, tile_height):
+        for x in range(0, width, tile_width):
+            block = data[y:y + tile_height, x:x + tile_width]
+            if block.shape != (tile_height, tile_width):
+                padded = np.zeros((tile_height, tile_width), dtype=data.dtype)
+                padded[:block.shape[0], :block.shape[1]] = block
+                block = padded
+            yield block
+
+
+def encode_frame(data, compression, predictor=True, tile=None, level=6):
+    """Compress one frame into the byte segments expected by TiffWriter.write
+
+    zlib and lzw release the GIL, so frames can be encoded concurrently on a thread pool.
+
+    Parameters:
+    -----------
+    data : np.ndarray
+        2D frame pixels
+    compression : {'zlib', 'deflate', 'lzw'}
+        Lossless compression to apply
+    predictor : bool
+        Apply horizontal differencing before compressing
+    tile : tuple of int, optional
+        Tile height and width, the frame is written as a single strip if None
+    level : int
+        Compression level for zlib and deflate
+
+    Returns:
+    --------
+    segments : list of bytes
+        One compressed strip, or one compressed tile per tile in row-major order
+    """
+    if compression == 'lzw':
+        try:
+            from imagecodecs import lzw_encode
+        except ImportError:
+            raise ValueError('LZW compression requires the imagecodecs package')
+        encode = lzw_encode
+    elif compression in ('zlib', 'deflate'):
+        def encode(buffer):
+            return zlib.compress(buffer, level)
+    else:
+        raise ValueError('Unsupported compression: ' + str(compression))
+
+    if tile is None:
+        blocks = [data]
+    else:
+        blocks = frame_tiles(data, tile)
+
+    segments = []
+    for block in blocks:
+        if predictor:
+            block = horizontal_difference(block)
+        segments.append(encode(np.ascontiguousarray(block).tobytes()))
+
+    return segments
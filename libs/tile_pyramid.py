@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+tile_pyramid.py -- tile grid of the detail levels shown when zooming in past the overview image
+Author Paul L. D. Roberts
+Copyright 2020  Scripps Institution of Oceanography
+Distributed under MIT license. See license.txt for more information.
+"""
+
+import numpy as np
+
+# output pixels per tile side, so a tile costs the same to decode at every level
+TILE_SIZE = 512
+
+# extra sensor pixels read around a native resolution tile so demosaicing at the tile
+# edges sees the same neighbors as in the full frame, must be even
+TILE_MARGIN = 2
+
+# detail levels, as sensor pixels per output pixel: 1 is demosaiced at native resolution,
+# 2 is one output pixel per 2x2 Bayer cell
+DETAIL_LEVELS = (1, 2)
+
+
+class TilePyramid:
+    """Levels and tile grid for one sensor size
+
+    The overview image, overview_height rows high, is the top of the pyramid and is shown
+    by default. Below it are the detail levels that are finer than the overview. Each is
+    split into tiles of TILE_SIZE output pixels that are aligned to the Bayer pattern.
+    Tiles are identified by (level, row, col).
+    """
+
+    def __init__(self, width, height, overview_height=1080, tile_size=TILE_SIZE):
+
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.overview_level = height / overview_height
+        self.levels = [level for level in DETAIL_LEVELS if level < self.overview_level]
+
+    def level_for(self, sensor_pixels_per_screen_pixel):
+        """Coarsest detail level that is at least as fine as the screen, None if the overview is enough"""
+
+        if not self.levels or sensor_pixels_per_screen_pixel >= self.overview_level:
+            return None
+        finer = [level for level in self.levels if level <= sensor_pixels_per_screen_pixel]
+        return finer[-1] if finer else self.levels[0]
+
+    def tile_span(self, level):
+        # sensor pixels covered by one tile side
+        return self.tile_size * level
+
+    def visible_tiles(self, level, region):
+        """Tiles of a level that overlap region
+
+        Parameters:
+        -----------
+        level : int
+            Detail level
+        region : tuple of float
+            (x0, y0, x1, y1) in sensor pixels, y down
+
+        Returns:
+        --------
+        tiles : list of tuple
+            (level, row, col) of each tile, nearest the center of the region first
+        """
+        span = self.tile_span(level)
+        x0, y0, x1, y1 = region
+        cols = range(max(int(x0 // span), 0), min(int(np.ceil(x1 / span)), int(np.ceil(self.width / span))))
+        rows = range(max(int(y0 // span), 0), min(int(np.ceil(y1 / span)), int(np.ceil(self.height / span))))
+        center_x, center_y = (x0 + x1) / 2, (y0 + y1) / 2
+        tiles = [(level, row, col) for row in rows for col in cols]
+        tiles.sort(key=lambda t: (abs((t[2] + 0.5) * span - center_x) + abs((t[1] + 0.5) * span - center_y)))
+        return tiles
+
+    def tile_region(self, tile):
+        """Sensor pixel region (x, y, width, height) of a tile, clipped to the sensor and to whole Bayer cells"""
+
+        level, row, col = tile
+        span = self.tile_span(level)
+        x, y = col * span, row * span
+        block = 2 * level
+        width = (min(x + span, self.width) - x) // block * block
+        height = (min(y + span, self.height) - y) // block * block
+        return x, y, width, height
+
+    def read_region(self, tile):
+        """Region to read for a tile, with a margin at native resolution, and the crop back to the tile
+
+        Returns:
+        --------
+        region : tuple of int
+            (x, y, width, height) of sensor pixels to read
+        crop : tuple of int
+            (x, y, width, height) of the tile in the decoded region, in output pixels
+        """
+        level = tile[0]
+        x, y, width, height = self.tile_region(tile)
+        margin = TILE_MARGIN if level == 1 else 0
+        left, top = min(margin, x), min(margin, y)
+        right = min(margin, self.width // 2 * 2 - x - width)
+        bottom = min(margin, self.height // 2 * 2 - y - height)
+        region = (x - left, y - top, width + left + right, height + top + bottom)
+        return region, (left, top, width // level, height // level)
+
+
+def decode_tile(decoder, data, level, crop):
+    """Decode the raw pixels read for a tile and crop it, see TilePyramid.read_region
+
+    The decoder demosaics the region at native resolution for level 1 and uses one
+    output pixel per Bayer cell for level 2.
+    """
+    decoder.target_height = data.shape[0] // level
+    image = decoder.decode(data)
+    x, y, width, height = crop
+    return np.ascontiguousarray(image[y:y + height, x:x + width])
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+verify.py -- check BUMP bin files for dropped, damaged or truncated frames from the headers only
+Author Paul L. D. Roberts
+Copyright 2020  Scripps Institution of Oceanography
+Distributed under MIT license. See license.txt for more information.
+"""
+
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from libs.raw_image import RawImage
+from libs.logger import LOG
+
+# number of frame indices listed for each kind of problem
+MAX_LISTED = 10
+
+
+def verify_bin_file(bin_path):
+    """Check the frame headers of one bin file with vectorized tests over the frame table
+
+    Only the file header and the frame headers are read, in one strided pass, so a file
+    is checked without touching its pixel data. The sidecar index is not used or written.
+
+    Errors (the file is damaged):
+        a partial frame at the end of the file, frame width or height different from the
+        file header, frame numbers that repeat or go backwards, timestamps that do not increase
+    Warnings (the camera skipped frames):
+        gaps in the frame numbers
+
+    Parameters:
+    -----------
+    bin_path : str
+        Path to the bin file
+
+    Returns:
+    --------
+    report : dict
+        path, ok, errors and warnings (lists of messages), frames, dropped_frames, gaps,
+        trailing_bytes, start_time, end_time, duration (s) and fps, plus the first frame
+        indices of each problem under gap_frames, size_mismatch_frames, frame_number_reset_frames
+        and time_reversal_frames
+    """
+    report = {
+        'path': bin_path,
+        'ok': False,
+        'errors': [],
+        'warnings': [],
+        'frames': 0,
+        'dropped_frames': 0,
+        'gaps': 0,
+        'trailing_bytes': 0,
+        'start_time': None,
+        'end_time': None,
+        'duration': None,
+        'fps': None,
+        'gap_frames': [],
+        'size_mismatch_frames': [],
+        'frame_number_reset_frames': [],
+        'time_reversal_frames': []
+    }
+
+    try:
+        rw = RawImage(bin_path)
+    except Exception as e:
+        report['errors'].append('Unreadable file header: ' + repr(e))
+        return report
+    if not rw.file_valid:
+        report['errors'].append('Could not open file')
+        return report
+
+    try:
+        header = rw.file_header
+        if header['pixel_format'] not in (1, 2) or rw.file_fmt not in (1, 2) or rw.frame_pixels() <= 0:
+            report['errors'].append('Invalid file header: format ' + str(rw.file_fmt) + ', pixel format ' +
+                                    str(header['pixel_format']) + ', ' + str(rw.img_width) + 'x' + str(rw.img_height))
+            return report
+
+        report['frames'] = rw.frames_in_file
+        report['trailing_bytes'] = int((rw.file_size - rw.file_header_length) % rw.frame_size_in_bytes())
+        if report['trailing_bytes']:
+            report['errors'].append('Partial frame at end of file: ' + str(report['trailing_bytes']) + ' bytes')
+
+        table = rw.frame_table()
+    finally:
+        rw.close()
+
+    if len(table) > 0:
+        size_mismatch = np.flatnonzero((table['width'] != rw.img_width) | (table['height'] != rw.img_height))
+        steps = np.diff(table['frame_number'].astype(np.int64))
+        resets = np.flatnonzero(steps <= 0) + 1
+        gaps = np.flatnonzero(steps > 1) + 1
+        micros = table['system_micros'].astype(np.int64)
+        time_reversals = np.flatnonzero(np.diff(micros) <= 0) + 1
+
+        report['size_mismatch_frames'] = size_mismatch[:MAX_LISTED].tolist()
+        report['frame_number_reset_frames'] = resets[:MAX_LISTED].tolist()
+        report['gap_frames'] = gaps[:MAX_LISTED].tolist()
+        report['time_reversal_frames'] = time_reversals[:MAX_LISTED].tolist()
+        report['gaps'] = len(gaps)
+        report['dropped_frames'] = int(np.sum(steps[gaps - 1] - 1))
+
+        report['start_time'] = float(micros[0]) / 1e6
+        report['end_time'] = float(micros[-1]) / 1e6
+        report['duration'] = (micros[-1] - micros[0]) / 1e6
+        if report['duration'] > 0:
+            report['fps'] = (len(table) - 1) / report['duration']
+
+        if len(size_mismatch):
+            report['errors'].append(str(len(size_mismatch)) + ' frames with a size different from the file header')
+        if len(resets):
+            report['errors'].append(str(len(resets)) + ' frame numbers that repeat or go backwards')
+        if len(time_reversals):
+            report['errors'].append(str(len(time_reversals)) + ' timestamps that do not increase')
+        if len(gaps):
+            report['warnings'].append(str(report['dropped_frames']) + ' dropped frames in ' + str(len(gaps)) + ' gaps')
+
+    report['ok'] = not report['errors']
+    return report
+
+
+def verify_bin_files(bin_files, jobs=None):
+    """Verify bin files with a pool of worker processes, see verify_bin_file
+
+    Parameters:
+    -----------
+    bin_files : list of str
+        Paths to the bin files to check
+    jobs : int, optional
+        Number of worker processes, defaults to the number of CPUs
+
+    Returns:
+    --------
+    reports : list of dict
+        One report per bin file, in the order of bin_files
+    """
+    if jobs is None or jobs < 1:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, max(len(bin_files), 1))
+
+    LOG.info('Verifying ' + str(len(bin_files)) + ' bin files with ' + str(jobs) + ' worker(s)')
+
+    start = time.time()
+    if jobs == 1:
+        reports = [verify_bin_file(bin_file) for bin_file in bin_files]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            reports = list(pool.map(verify_bin_file, bin_files, chunksize=4))
+
+    failed = [r for r in reports if not r['ok']]
+    LOG.info('Verify finished: ' + str(len(reports) - len(failed)) + ' ok, ' + str(len(failed)) +
+             ' with errors, ' + str(sum(r['frames'] for r in reports)) + ' frames in ' +
+             '%.1f' % (time.time() - start) + ' s')
+    return reports
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+benchmark.py -- time reading, decoding and exporting synthetic BUMP bin files
+Author Paul L. D. Roberts
+Copyright 2020  Scripps Institution of Oceanography
+Distributed under MIT license. See license.txt for more information.
+
+Writes synthetic bin files for a set of cases (file format, bit depth, binning and size),
+then times file open, header scan, random and sequential read_frame, display decode and
+tiff export. Results are printed and written as JSON so runs of different versions can
+be compared. Run from the repository root:
+
+    python scripts/benchmark.py --output bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from libs.raw_image import RawImage
+from libs.synthetic import write_bin_file
+from libs.image_tools import DisplayDecoder
+
+# name: (file format, bytes per pixel, width, height, binning)
+CASES = {
+    'fmt1_8bit_1224x1024_bin2': (1, 1, 1224, 1024, 2),
+    'fmt2_16bit_1224x1024_bin2': (2, 2, 1224, 1024, 2),
+    'fmt2_16bit_2448x2048': (2, 2, 2448, 2048, 1),
+    'fmt2_16bit_4000x3000': (2, 2, 4000, 3000, 1),
+}
+
+
+def git_version():
+    try:
+        return subprocess.check_output(
+            ['git', 'describe', '--always', '--dirty'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def record(results, case, test, frames, nbytes, seconds):
+    seconds = max(seconds, 1e-9)
+    result = {
+        'case': case,
+        'test': test,
+        'frames': frames,
+        'bytes': nbytes,
+        'seconds': seconds,
+        'mb_per_s': nbytes / 1e6 / seconds,
+        'frames_per_s': frames / seconds
+    }
+    results.append(result)
+    print('%-28s %-26s %9.1f MB/s %10.1f frames/s' % (case, test, result['mb_per_s'], result['frames_per_s']))
+
+
+def run_case(case, params, frames, work_dir, results):
+
+    file_fmt, pixel_format, width, height, binning = params
+    bin_path = os.path.join(work_dir, case + '.bin')
+    write_bin_file(bin_path, frames=frames, width=width, height=height, pixel_format=pixel_format,
+                   file_fmt=file_fmt, vert_binning=binning, horz_binning=binning)
+
+    # file open, then open plus a scan of all frame headers without and with the sidecar index
+    start = time.perf_counter()
+    rw = RawImage(bin_path)
+    record(results, case, 'open', 1, rw.file_header_length, time.perf_counter() - start)
+    frame_bytes = rw.frame_size_in_bytes()
+    header_bytes = frame_bytes - rw.frame_pixels() * pixel_format
+    rw.close()
+
+    start = time.perf_counter()
+    rw = RawImage(bin_path)
+    rw.frame_table()
+    record(results, case, 'open_scan', frames, frames * header_bytes, time.perf_counter() - start)
+    rw.close()
+
+    RawImage(bin_path, use_index=True).close()
+    start = time.perf_counter()
+    rw = RawImage(bin_path, use_index=True)
+    rw.frame_table()
+    record(results, case, 'open_scan_indexed', frames, frames * header_bytes, time.perf_counter() - start)
+    rw.close()
+
+    # read_frame, the pixels are summed so mapped pages are actually touched
+    order = np.random.default_rng(0).permutation(frames)
+    for use_mmap in [False, True]:
+        rw = RawImage(bin_path, use_mmap=use_mmap)
+        suffix = '_mmap' if use_mmap else ''
+        for name, indices in [('sequential', range(frames)), ('random', order)]:
+            start = time.perf_counter()
+            for i in indices:
+                _, data = rw.read_frame(int(i))
+                data.sum()
+            record(results, case, 'read_' + name + suffix, frames, frames * frame_bytes,
+                   time.perf_counter() - start)
+        rw.close()
+
+    # display decode
+    rw = RawImage(bin_path, use_mmap=True)
+    decoder = DisplayDecoder(1080)
+    decoder.decode(rw.read_frame(0)[1])
+    start = time.perf_counter()
+    for i in range(frames):
+        decoder.decode(rw.read_frame(i)[1])
+    record(results, case, 'display_decode', frames, frames * frame_bytes, time.perf_counter() - start)
+
+    # tiff export
+    for compression in ['none', 'zlib']:
+        out_dir = os.path.join(work_dir, 'export_' + compression)
+        os.makedirs(out_dir, exist_ok=True)
+        start = time.perf_counter()
+        rw.export_as_tiff(output_path=out_dir, compression=compression)
+        record(results, case, 'export_tiff_' + compression, frames, frames * frame_bytes,
+               time.perf_counter() - start)
+        shutil.rmtree(out_dir)
+    rw.close()
+
+    os.remove(bin_path)
+    if os.path.exists(bin_path + '.idx'):
+        os.remove(bin_path + '.idx')
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Benchmark BUMP Image on synthetic bin files")
+    parser.add_argument('--frames', type=int, default=20, help="Frames per synthetic file")
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=sorted(CASES),
+                        help="Cases to run (default: all)")
+    parser.add_argument('--work_dir', type=str, default=None,
+                        help="Directory for the synthetic files (default: a temp directory)")
+    parser.add_argument('--output', type=str, default=None, help="Path of the JSON results file")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='bump_bench_')
+    os.makedirs(work_dir, exist_ok=True)
+
+    results = []
+    try:
+        for case in args.cases:
+            run_case(case, CASES[case], args.frames, work_dir, results)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'version': git_version(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'frames': args.frames,
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
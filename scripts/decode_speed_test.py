@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the speed of the original display conversion in RawImageLoader with
+DisplayDecoder on synthetic Bayer frames of different sizes and bit depths.
+Run from the repository root: python scripts/decode_speed_test.py
+"""
+
+import os
+import sys
+import time
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from libs.image_tools import DisplayDecoder
+
+
+def legacy_decode(frame):
+    if frame.dtype == np.uint16:
+        image = (frame / 256).astype('uint8')
+    else:
+        image = frame
+    image = cv2.cvtColor(image, cv2.COLOR_BayerRG2BGR)
+    scale = 1080/image.shape[0]
+    return cv2.resize(image, (int(image.shape[1]*scale), int(image.shape[0]*scale)))
+
+
+def synthetic_frame(height, width, dtype):
+    # smooth scene with some texture, sampled through the Bayer mosaic
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    scene = 0.5 + 0.25 * np.sin(x / 37.0) * np.cos(y / 23.0) + 0.1 * np.sin(x / 3.0 + y / 5.0)
+    scene[1::2, 1::2] *= 0.8
+    scene[0::2, 0::2] *= 0.6
+    return (np.clip(scene, 0, 1) * np.iinfo(dtype).max).astype(dtype)
+
+
+def time_it(func, frame, repeats):
+    func(frame)
+    start = time.perf_counter()
+    for i in range(repeats):
+        func(frame)
+    return (time.perf_counter() - start) / repeats
+
+
+if __name__ == '__main__':
+
+    decoder = DisplayDecoder(1080)
+    repeats = 10
+
+    for height, width in [(3000, 4000), (2048, 2448), (1500, 2000)]:
+        for dtype in [np.uint8, np.uint16]:
+            frame = synthetic_frame(height, width, dtype)
+            legacy = time_it(legacy_decode, frame, repeats)
+            fast = time_it(decoder.decode, frame, repeats)
+            diff = np.mean(np.abs(legacy_decode(frame).astype(float) - decoder.decode(frame)))
+            print('%dx%d %-6s legacy %7.1f ms  decoder %7.1f ms  speedup %4.1fx  mean abs diff %.2f' % (
+                width, height, np.dtype(dtype).name, legacy * 1000, fast * 1000, legacy / fast, diff))